@@ -0,0 +1,152 @@
+import os
+import csv
+import glob
+import json
+import time
+import multiprocessing
+import instance
+from simulannealing import SimulatedAnnealing as SimulAnn
+
+# Columns of the CSV output; the JSON lines hold the same keys
+FIELDS = ['instance', 'nodes', 'edges', 'terminals', 'cost', 'tree_edges',
+        'seconds', 'error']
+
+def find_instances(specs):
+    """ Expand files, directories and glob patterns into the list of instance
+    files, largest first """
+    found = {}
+    for spec in specs:
+        if os.path.isdir(spec):
+            names = [os.path.join(spec, n) for n in os.listdir(spec)]
+        else:
+            names = glob.glob(spec)
+        for name in names:
+            if os.path.isfile(name) and instance.is_instance(name):
+                found[os.path.normpath(name)] = os.path.getsize(name)
+    return sorted(found, key=lambda n: (-found[n], n))
+
+def _complete(row):
+    """ Tell whether a CSV row holds a whole result: every field, with the
+    cost and the seconds as numbers """
+    if None in row or any(row.get(k) is None for k in FIELDS):
+        return False
+    try:
+        float(row['cost'])
+        float(row['seconds'])
+    except ValueError:
+        return False
+    return True
+
+def read_done(output):
+    """ Give the instances already written to the output file. A CSV row cut
+    by an interruption cannot always be told from the row of a failed
+    instance, so only the rows with a cost count """
+    done = set()
+    if not os.path.exists(output):
+        return done
+    f = open(output, 'r')
+    try:
+        if output.endswith('.csv'):
+            for row in csv.DictReader(f):
+                if _complete(row):
+                    done.add(row['instance'])
+        else:
+            for line in f:
+                try:
+                    done.add(json.loads(line)['instance'])
+                except (ValueError, KeyError):
+                    # A line cut by an interruption
+                    pass
+    finally:
+        f.close()
+    return done
+
+def solve(args):
+    """ Solve one instance, given with whether to use its binary cache, and
+    give its result as a dict """
+    filename, cache = args
+    result = dict.fromkeys(FIELDS)
+    result['instance'] = filename
+    start = time.time()
+    try:
+        inst = instance.load(filename, cache)
+        graph, terminals = inst.get_graph()
+        tree = SimulAnn(graph, terminals,
+                paths=inst.get_paths()).get_min_steiner_tree()
+        result['nodes'] = len(graph)
+        result['edges'] = graph.get_edge_count()
+        result['terminals'] = len(terminals)
+        result['cost'] = tree.get_cost()
+        result['tree_edges'] = len(tree.get_edges())
+    except Exception, err:
+        result['error'] = '%s: %s' %(type(err).__name__, err)
+    result['seconds'] = time.time() - start
+    return result
+
+class Batch(object):
+    """
+    Solve many instances over a pool of processes. The instances are handed
+    out largest first, so the long ones do not end the run alone, and each
+    result is appended to the output file as soon as it is known. Running
+    again with the same output skips the instances it already holds.
+
+    The output is CSV if its name ends with '.csv' and JSON lines otherwise.
+    Without 'cache', the binary caches of the instances are neither read nor
+    written.
+    """
+
+    def __init__(self, specs, output, jobs=None, cache=True):
+        self.specs = specs
+        self.output = output
+        self.jobs = jobs or multiprocessing.cpu_count()
+        self.cache = cache
+
+    def get_pending(self):
+        done = read_done(self.output)
+        return [i for i in find_instances(self.specs) if i not in done]
+
+    def run(self, callback=None):
+        """ Solve the pending instances, calling callback(result) for each
+        one, and give the number of instances solved """
+        pending = self.get_pending()
+        if not pending:
+            return 0
+
+        is_csv = self.output.endswith('.csv')
+        new_file = not os.path.exists(self.output) or \
+                os.path.getsize(self.output) == 0
+        f = open(self.output, 'a+')
+        if not new_file:
+            # Do not glue the first result to a line cut by an interruption
+            f.seek(-1, os.SEEK_END)
+            last = f.read(1)
+            # stdio needs a seek between a read and a write
+            f.seek(0, os.SEEK_END)
+            if last != '\n':
+                f.write('\n')
+        if is_csv:
+            writer = csv.DictWriter(f, FIELDS)
+            if new_file:
+                writer.writeheader()
+
+        # One task per worker life, so the memory of a big instance is given
+        # back before the next one
+        pool = multiprocessing.Pool(min(self.jobs, len(pending)),
+                maxtasksperchild=1)
+        count = 0
+        try:
+            for result in pool.imap_unordered(solve,
+                    [(name, self.cache) for name in pending]):
+                if is_csv:
+                    writer.writerow(result)
+                else:
+                    f.write(json.dumps(result) + '\n')
+                f.flush()
+                count += 1
+                if callback is not None:
+                    callback(result)
+        finally:
+            pool.terminate()
+            pool.join()
+            f.close()
+        return count
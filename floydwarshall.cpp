@@ -1,7 +1,9 @@
-
 #include <math.h>
 #include <string.h>
 
+/* The predecessors are kept in "last hop" form: pred[i*nn+j] is the node
+ * before j on the minimum path from i to j, i itself for an edge and -1 when
+ * there is no path. A path is walked back from j without any recursion */
 void floydwarshall(int nn, double m_adj[], double dist[], int pred[])
 {
   
@@ -34,7 +36,7 @@ void floydwarshall(int nn, double m_adj[], double dist[], int pred[])
 	double new_dist = dist[i*nn+k] + dist[k*nn+j];
 	if (dist[i*nn+j] > new_dist) {
 	  dist[i*nn+j] = new_dist;
-	  pred[i*nn+j] = k;
+	  pred[i*nn+j] = pred[k*nn+j];
 	}
       }
     }
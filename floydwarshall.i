@@ -6,5 +6,89 @@
 %{
 /* Put header files here or function declarations like below */
 void floydwarshall(int n, double* m_adj, double* dist, int* pred);
+
+/* Get the memory of an object exporting the buffer interface (array.array,
+ * numpy arrays, ctypes arrays, mmap...), checking it holds at least 'size'
+ * bytes. On success the view must be released with release_buffer() */
+static int get_buffer(PyObject *obj, Py_buffer *view, void **ptr,
+                      Py_ssize_t size, int writable, const char *name)
+{
+    int flags = PyBUF_C_CONTIGUOUS | (writable? PyBUF_WRITABLE : 0);
+
+    view->obj = NULL;
+    if (PyObject_CheckBuffer(obj)) {
+        if (PyObject_GetBuffer(obj, view, flags))
+            return -1;
+        *ptr = view->buf;
+        if (view->len < size) {
+            PyBuffer_Release(view);
+            view->obj = NULL;
+            PyErr_Format(PyExc_ValueError, "%s: buffer too small", name);
+            return -1;
+        }
+        return 0;
+    }
+#if PY_VERSION_HEX < 0x03000000
+    /* Objects that only know the old buffer protocol */
+    Py_ssize_t len;
+    if (writable && PyObject_AsWriteBuffer(obj, ptr, &len))
+        return -1;
+    if (!writable && PyObject_AsReadBuffer(obj, (const void **) ptr, &len))
+        return -1;
+    if (len < size) {
+        PyErr_Format(PyExc_ValueError, "%s: buffer too small", name);
+        return -1;
+    }
+    return 0;
+#else
+    PyErr_Format(PyExc_TypeError, "%s: a buffer is required", name);
+    return -1;
+#endif
+}
+
+static void release_buffer(Py_buffer *view)
+{
+    if (view->obj != NULL)
+        PyBuffer_Release(view);
+}
+%}
+
+void floydwarshall(int n, double* m_adj, double* dist, int* pred);
+
+%inline %{
+/* Run the kernel straight on the memory of the given objects: m_adj
+ * and dist hold n*n doubles and pred n*n ints, in row-major order. Nothing
+ * is copied and the GIL is released during the computation */
+PyObject *floydwarshall_buffer(int n, PyObject *m_adj, PyObject *dist,
+                               PyObject *pred)
+{
+    Py_buffer v_adj, v_dist, v_pred;
+    void *p_adj, *p_dist, *p_pred;
+    Py_ssize_t cells = (Py_ssize_t) n * n;
+
+    if (n < 0) {
+        PyErr_SetString(PyExc_ValueError, "n must not be negative");
+        return NULL;
+    }
+    if (get_buffer(m_adj, &v_adj, &p_adj, cells*sizeof(double), 0, "m_adj"))
+        return NULL;
+    if (get_buffer(dist, &v_dist, &p_dist, cells*sizeof(double), 1, "dist")) {
+        release_buffer(&v_adj);
+        return NULL;
+    }
+    if (get_buffer(pred, &v_pred, &p_pred, cells*sizeof(int), 1, "pred")) {
+        release_buffer(&v_adj);
+        release_buffer(&v_dist);
+        return NULL;
+    }
+
+    Py_BEGIN_ALLOW_THREADS
+    floydwarshall(n, (double *) p_adj, (double *) p_dist, (int *) p_pred);
+    Py_END_ALLOW_THREADS
+
+    release_buffer(&v_adj);
+    release_buffer(&v_dist);
+    release_buffer(&v_pred);
+    Py_RETURN_NONE;
+}
 %}
-%include floydwarshall.cpp
@@ -1,61 +1,95 @@
 # This file was automatically generated by SWIG (http://www.swig.org).
-# Version 1.3.35
+# Version 4.0.2
 #
-# Don't modify this file, modify the SWIG interface instead.
-# This file is compatible with both classic and new-style classes.
+# Do not make changes to this file unless you know what you are doing--modify
+# the SWIG interface file instead.
+
+from sys import version_info as _swig_python_version_info
+if _swig_python_version_info < (2, 7, 0):
+    raise RuntimeError("Python 2.7 or later required")
+
+# Import the low-level C/C++ module
+if __package__ or "." in __name__:
+    from . import _floydwarshall
+else:
+    import _floydwarshall
 
-import _floydwarshall
-import new
-new_instancemethod = new.instancemethod
 try:
-    _swig_property = property
-except NameError:
-    pass # Python < 2.2 doesn't have 'property'.
-def _swig_setattr_nondynamic(self,class_type,name,value,static=1):
-    if (name == "thisown"): return self.this.own(value)
-    if (name == "this"):
-        if type(value).__name__ == 'PySwigObject':
-            self.__dict__[name] = value
-            return
-    method = class_type.__swig_setmethods__.get(name,None)
-    if method: return method(self,value)
-    if (not static) or hasattr(self,name):
-        self.__dict__[name] = value
-    else:
-        raise AttributeError("You cannot add attributes to %s" % self)
-
-def _swig_setattr(self,class_type,name,value):
-    return _swig_setattr_nondynamic(self,class_type,name,value,0)
-
-def _swig_getattr(self,class_type,name):
-    if (name == "thisown"): return self.this.own()
-    method = class_type.__swig_getmethods__.get(name,None)
-    if method: return method(self)
-    raise AttributeError,name
+    import builtins as __builtin__
+except ImportError:
+    import __builtin__
 
 def _swig_repr(self):
-    try: strthis = "proxy of " + self.this.__repr__()
-    except: strthis = ""
+    try:
+        strthis = "proxy of " + self.this.__repr__()
+    except __builtin__.Exception:
+        strthis = ""
     return "<%s.%s; %s >" % (self.__class__.__module__, self.__class__.__name__, strthis,)
 
-import types
-try:
-    _object = types.ObjectType
-    _newclass = 1
-except AttributeError:
-    class _object : pass
-    _newclass = 0
-del types
-
-
-new_doubleArray = _floydwarshall.new_doubleArray
-delete_doubleArray = _floydwarshall.delete_doubleArray
-doubleArray_getitem = _floydwarshall.doubleArray_getitem
-doubleArray_setitem = _floydwarshall.doubleArray_setitem
-new_intArray = _floydwarshall.new_intArray
-delete_intArray = _floydwarshall.delete_intArray
-intArray_getitem = _floydwarshall.intArray_getitem
-intArray_setitem = _floydwarshall.intArray_setitem
-floydwarshall = _floydwarshall.floydwarshall
+
+def _swig_setattr_nondynamic_instance_variable(set):
+    def set_instance_attr(self, name, value):
+        if name == "thisown":
+            self.this.own(value)
+        elif name == "this":
+            set(self, name, value)
+        elif hasattr(self, name) and isinstance(getattr(type(self), name), property):
+            set(self, name, value)
+        else:
+            raise AttributeError("You cannot add instance attributes to %s" % self)
+    return set_instance_attr
+
+
+def _swig_setattr_nondynamic_class_variable(set):
+    def set_class_attr(cls, name, value):
+        if hasattr(cls, name) and not isinstance(getattr(cls, name), property):
+            set(cls, name, value)
+        else:
+            raise AttributeError("You cannot add class attributes to %s" % cls)
+    return set_class_attr
+
+
+def _swig_add_metaclass(metaclass):
+    """Class decorator for adding a metaclass to a SWIG wrapped class - a slimmed down version of six.add_metaclass"""
+    def wrapper(cls):
+        return metaclass(cls.__name__, cls.__bases__, cls.__dict__.copy())
+    return wrapper
+
+
+class _SwigNonDynamicMeta(type):
+    """Meta class to enforce nondynamic attributes (no new attributes) for a class"""
+    __setattr__ = _swig_setattr_nondynamic_class_variable(type.__setattr__)
+
+
+
+def new_doubleArray(nelements):
+    return _floydwarshall.new_doubleArray(nelements)
+
+def delete_doubleArray(ary):
+    return _floydwarshall.delete_doubleArray(ary)
+
+def doubleArray_getitem(ary, index):
+    return _floydwarshall.doubleArray_getitem(ary, index)
+
+def doubleArray_setitem(ary, index, value):
+    return _floydwarshall.doubleArray_setitem(ary, index, value)
+
+def new_intArray(nelements):
+    return _floydwarshall.new_intArray(nelements)
+
+def delete_intArray(ary):
+    return _floydwarshall.delete_intArray(ary)
+
+def intArray_getitem(ary, index):
+    return _floydwarshall.intArray_getitem(ary, index)
+
+def intArray_setitem(ary, index, value):
+    return _floydwarshall.intArray_setitem(ary, index, value)
+
+def floydwarshall(n, m_adj, dist, pred):
+    return _floydwarshall.floydwarshall(n, m_adj, dist, pred)
+
+def floydwarshall_buffer(n, m_adj, dist, pred):
+    return _floydwarshall.floydwarshall_buffer(n, m_adj, dist, pred)
 
 
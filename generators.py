@@ -0,0 +1,137 @@
+import math
+import random
+from array import array
+from itertools import repeat
+import instance
+from graph_utils import ArrayUnionFind
+
+# Random instances built straight as edge arrays, for stress tests at the
+# sizes of the real networks. Every generator takes an explicit seed and gives
+# the same Instance for the same arguments. Its terminals are 'terminals'
+# distinct nodes, given as a number or as a fraction of the nodes. All the
+# graphs are connected, so any set of terminals has a solution.
+
+MAX_WEIGHT = 10000
+
+def _terminals(rand, n, terminals):
+    if isinstance(terminals, float):
+        terminals = int(round(terminals * n))
+    terminals = min(n, max(2, terminals))
+    return array('i', sorted(rand.sample(xrange(n), terminals)))
+
+def _weights(rand, m, max_weight):
+    r = rand.random
+    return array('d', [float(int(r() * max_weight) + 1) for k in xrange(m)])
+
+def complete(n, terminals=0.1, seed=None, max_weight=MAX_WEIGHT):
+    """ The complete graph of n nodes, with weights drawn uniformly from 1 to
+    max_weight """
+    rand = random.Random(seed)
+    us, vs = array('i'), array('i')
+    for i in xrange(n - 1):
+        us.extend(repeat(i, n - 1 - i))
+        vs.extend(xrange(i + 1, n))
+    ws = _weights(rand, len(us), max_weight)
+    return instance.Instance(n, us, vs, ws, _terminals(rand, n, terminals),
+            'complete-%d-%s' %(n, seed))
+
+def erdos_renyi(n, m, terminals=0.1, seed=None, max_weight=MAX_WEIGHT):
+    """
+    A sparse random graph of n nodes and m edges (at least n - 1), with
+    weights drawn uniformly from 1 to max_weight. A random spanning tree
+    makes it connected and the other edges join pairs of nodes drawn
+    uniformly, without repetition.
+    """
+    if not n - 1 <= m <= n * (n - 1) / 2:
+        raise ValueError('%d edges do not fit %d nodes' %(m, n))
+    rand = random.Random(seed)
+    r = rand.random
+    order = range(n)
+    rand.shuffle(order)
+    us = array('i', order[1:])
+    vs = array('i', [order[int(r() * i)] for i in xrange(1, n)])
+    # The pairs are kept as the numbers a*n + b, a < b, much smaller than tuples
+    seen = set(a*n + b if a < b else b*n + a for a, b in zip(us, vs))
+    while len(us) < m:
+        a, b = int(r() * n), int(r() * n)
+        key = a*n + b if a < b else b*n + a
+        if a != b and key not in seen:
+            seen.add(key)
+            us.append(a)
+            vs.append(b)
+    ws = _weights(rand, len(us), max_weight)
+    return instance.Instance(n, us, vs, ws, _terminals(rand, n, terminals),
+            'er-%d-%d-%s' %(n, m, seed))
+
+def geometric(n, radius=None, terminals=0.1, seed=None, scale=MAX_WEIGHT):
+    """
+    n points drawn uniformly in the unit square, joined when they are closer
+    than 'radius', all of them if it is None, as in berlin52. The weights are
+    the distances times 'scale', rounded. The components left apart are
+    joined one to the next by the edge between their first points.
+    """
+    if radius is not None and radius <= 0:
+        raise ValueError('the radius %s is not positive' %radius)
+    rand = random.Random(seed)
+    r = rand.random
+    xs = [r() for i in xrange(n)]
+    ys = [r() for i in xrange(n)]
+    if radius is None:
+        radius = math.sqrt(2.0)
+    # Points are put in cells of side radius, so only the points of the
+    # neighbouring cells are compared
+    side = max(1, min(n, int(1.0 / radius)))
+    cells = {}
+    for i in xrange(n):
+        key = (min(int(xs[i] * side), side - 1),
+                min(int(ys[i] * side), side - 1))
+        cells.setdefault(key, []).append(i)
+    us, vs, ws = array('i'), array('i'), array('d')
+    r2 = radius * radius
+    for (cx, cy), points in cells.iteritems():
+        near = []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                near.extend(cells.get((cx + dx, cy + dy), ()))
+        for i in points:
+            x, y = xs[i], ys[i]
+            for j in near:
+                if j > i:
+                    d = (xs[j] - x) ** 2 + (ys[j] - y) ** 2
+                    if d <= r2:
+                        us.append(i)
+                        vs.append(j)
+                        ws.append(max(1.0, round(math.sqrt(d) * scale)))
+
+    uf = ArrayUnionFind(n)
+    for a, b in zip(us, vs):
+        uf.union(a, b)
+    firsts = [i for i in xrange(n) if uf.find(i) == i]
+    for a, b in zip(firsts, firsts[1:]):
+        us.append(a)
+        vs.append(b)
+        ws.append(max(1.0, round(math.hypot(xs[a] - xs[b], ys[a] - ys[b]) *
+            scale)))
+    return instance.Instance(n, us, vs, ws, _terminals(rand, n, terminals),
+            'geometric-%d-%s-%s' %(n, radius, seed))
+
+def grid(rows, columns, terminals=0.1, seed=None, max_weight=MAX_WEIGHT):
+    """ The rows x columns grid, each node joined to the ones on its right
+    and below, with weights drawn uniformly from 1 to max_weight """
+    rand = random.Random(seed)
+    n = rows * columns
+    us, vs = array('i'), array('i')
+    for i in xrange(rows):
+        row = i * columns
+        us.extend(xrange(row, row + columns - 1))
+        vs.extend(xrange(row + 1, row + columns))
+        if i < rows - 1:
+            us.extend(xrange(row, row + columns))
+            vs.extend(xrange(row + columns, row + 2 * columns))
+    ws = _weights(rand, len(us), max_weight)
+    return instance.Instance(n, us, vs, ws, _terminals(rand, n, terminals),
+            'grid-%dx%d-%s' %(rows, columns, seed))
+
+# Generators by name
+FAMILIES = {'complete': complete, 'erdos-renyi': erdos_renyi,
+        'geometric': geometric, 'grid': grid}
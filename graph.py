@@ -1,4 +1,7 @@
 import graph_utils
+from array import array
+from bisect import bisect_left
+from itertools import izip, count
 
 class GraphError(Exception):
 
@@ -9,32 +12,92 @@ class GraphError(Exception):
         return self.value
 
 class Node(object):
-    """ Represents a node that has a label. This label can be any object """
+    """ Represents a node that has a label. This label can be any object.
 
-    def __init__(self, label):
+    'index' is the number of the node in the CSRGraph holding it, if any """
+
+    __slots__ = ('label', 'index')
+
+    def __init__(self, label, index=None):
         self.label = label
+        self.index = index
 
     def __str__(self):
         return "".join(["<node ", str(self.label), ">"])
 
+    def __setstate__(self, state):
+        _set_slots(self, state)
+        self.index = getattr(self, 'index', None)
+
 class Edge(object):
-    """ Represents a weighted edge that connects two Node objects """
+    """ Represents a weighted edge that connects two Node objects.
+
+    'id' is the number of the edge in the CSRGraph holding it, if any """
 
-    def __init__(self, u, v, weight=0):
+    __slots__ = ('u', 'v', 'weight', 'id')
+
+    def __init__(self, u, v, weight=0, id=None):
         self.u = u
         self.v = v
         self.weight = weight
+        self.id = id
 
     def __str__(self):
         return "".join(["<edge ", str(self.u), ", ", str(self.v),
             str(self.weight), ">"])
 
+    def __setstate__(self, state):
+        _set_slots(self, state)
+        self.id = getattr(self, 'id', None)
+
+def _set_slots(obj, state):
+    """ Restore the pickled state of an object with __slots__: a (dict,
+    slots) pair, or the plain dict of the pickles written before the slots
+    """
+    if isinstance(state, tuple):
+        state = dict(state[0] or {}, **(state[1] or {}))
+    for key, value in state.iteritems():
+        setattr(obj, key, value)
+
+def csr_arrays(n, us, vs):
+    """ Give the compressed sparse row adjacency of the undirected edges
+    (us[k], vs[k]) over the nodes 0..n-1: the neighbors of i are
+    adj[indptr[i]:indptr[i+1]] and eid holds the number of the edge leading
+    to each of them """
+    indptr = array('i', [0]) * (n + 1)
+    for a in us:
+        indptr[a + 1] += 1
+    for b in vs:
+        indptr[b + 1] += 1
+    for i in xrange(n):
+        indptr[i + 1] += indptr[i]
+
+    pos = indptr[:-1]
+    adj = array('i', [0]) * indptr[n]
+    eid = array('i', [0]) * indptr[n]
+    for k, a, b in izip(count(), us, vs):
+        p = pos[a]
+        adj[p] = b
+        eid[p] = k
+        pos[a] = p + 1
+        p = pos[b]
+        adj[p] = a
+        eid[p] = k
+        pos[b] = p + 1
+    return indptr, adj, eid
+
 class Graph(object):
-    """ Represent undirected graphs built of nodes and edges """
+    """ Represent undirected graphs built of nodes and edges.
+
+    Each node is mapped to a dict from its neighbors to the edges joining
+    them, so an edge is stored once and found in O(1). The list of edges is
+    built on demand and kept until the graph changes """
 
     def __init__(self):
         self.nodes = {}
-        self.edges = {}
+        self.labels = {}
+        self.edge_count = 0
+        self._edges = None
 
     def __str__(self):
         slist = [str(i) for i in self.get_edges()]
@@ -59,14 +122,15 @@ class Graph(object):
     def __getitem__(self, node):
         """ Return the node's neighbors """
         try:
-            return self.nodes[node]
+            return self.nodes[node].keys()
         except KeyError:
             return []
 
     def copy (self):
         """ Return a shallow copy of the graph """
         g = Graph()
-        map(lambda e: g.add_edge(e), self.get_nodes())
+        map(lambda n: g.add_node(n), self.get_nodes())
+        map(lambda e: g.add_edge(e), self.get_edges())
         return g
 
     def get_nodes(self):
@@ -79,126 +143,152 @@ class Graph(object):
 
     def get_edges(self):
         """ Give the graph edges. Because the graph is undirected, (u, v) is
-        the same as (v, u) and is returned once """
-        return {}.fromkeys(self.edges.values()).keys()
+        the same as (v, u) and is returned once. The list is shared until the
+        graph changes and must not be modified """
+        if self._edges is None:
+            self._edges = [e for u, adj in self.nodes.iteritems()
+                    for e in adj.itervalues() if e.u is u]
+        return self._edges
+
+    def get_edge_count(self):
+        """ Give the number of edges """
+        return self.edge_count
+
+    def get_edge_arrays(self, nodes=None):
+        """ Give (nodes, u, v, w): the edge k joins nodes[u[k]] and
+        nodes[v[k]] with weight w[k]. nodes is the given order of the nodes or
+        the graph's own one """
+        if nodes is None:
+            nodes = self.get_nodes()
+        index = dict((x, i) for i, x in enumerate(nodes))
+        edges = self.get_edges()
+        return (nodes, array('i', [index[e.u] for e in edges]),
+                array('i', [index[e.v] for e in edges]),
+                array('d', [e.weight for e in edges]))
 
     def get_node(self, label):
         """ Return the node given its label """
-        try:
-            return [i for i in self.nodes if i.label == label][0]
-        except IndexError:
-            return None
+        return self.labels.get(label)
 
     def get_edge(self, u, v):
         """ Return the edge given the nodes it connects """
         try:
-            return self.edges[(u, v)]
+            return self.nodes[u][v]
         except KeyError:
             return None
 
     def has_edge(self, u, v):
         """ Return whether an edge between u and v exists or not """
-        return self.edges.has_key((u, v)) and self.edges.has_key((v, u))
+        return v in self.nodes.get(u, ())
 
     def add_node(self, node):
         """ Add the node """
         if node not in self.nodes:
-            self.nodes[node] = []
+            self.nodes[node] = {}
+            self.labels[node.label] = node
             return True
         return False
 
     def add_edge(self, edge):
         """ Add the edges to the graph. If the edge is connected to some node
-        that doesnt belong to the graph, the node is added also """
-        try:
-            if edge.u in self.nodes[edge.v] and edge.v in self.nodes[edge.u] \
-            and edge == self.edges[(edge.u, edge.v)] and \
-            edge == self.edges[(edge.v, edge.u)]:
-                return False
-            elif edge.u in self.nodes[edge.v] and edge.v not in \
-            self.nodes[edge.u]:
-                return False
-            elif edge.u not in self.nodes[edge.v] and edge.v in \
-            self.nodes[edge.u]:
-                return False
-        except KeyError:
-            pass
+        that doesnt belong to the graph, the node is added also. Nothing is
+        done if the nodes are already connected """
+        if edge.v in self.nodes.get(edge.u, ()):
+            return False
         self.add_node(edge.u)
         self.add_node(edge.v)
-        self.nodes[edge.u].append(edge.v)
-        self.nodes[edge.v].append(edge.u)
-        self.edges[(edge.u, edge.v)] = edge
-        self.edges[(edge.v, edge.u)] = edge
+        self.nodes[edge.u][edge.v] = edge
+        self.nodes[edge.v][edge.u] = edge
+        self.edge_count += 1
+        self._edges = None
         return True
 
     def del_node(self, node):
         # Delete all edges adjacent to this node
         try:
-            neighbors = self[node]
+            neighbors = self.nodes[node].keys()
         except KeyError:
             raise GraphError('Node %s not in graph' %str(node))
         map(lambda v: self.del_edge(self.get_edge(v, node)), neighbors)
-        try:
-            self.nodes.pop(node)
-        except KeyError:
-            pass
+        self._forget(node)
+
+    def _forget(self, node):
+        """ Remove the node from the dicts, if it is there """
+        if self.nodes.pop(node, None) is not None and \
+        self.labels.get(node.label) is node:
+            del self.labels[node.label]
 
     def del_edge(self, edge):
         """ Remove the given edge. Notice this method doesnt handle graph
         disconection and all nodes with no incident edge will be removed """
         try:
-            if edge.v not in self[edge.u] or edge.u not in self[edge.v]:
+            if self.nodes[edge.u].get(edge.v) is not edge:
                 raise GraphError('Bad edge %s on the graph' %str(edge))
-            self.edges.pop((edge.u, edge.v))
-            self.edges.pop((edge.v, edge.u))
-            self[edge.u].remove(edge.v)
-            self[edge.v].remove(edge.u)
-            # Delete isolated nodes
-            if self.order(edge.u) == 0:
-                self.nodes.pop(edge.u)
-            if self.order(edge.v) == 0:
-                self.nodes.pop(edge.v)
+            del self.nodes[edge.u][edge.v]
+            del self.nodes[edge.v][edge.u]
         except KeyError:
             raise GraphError('Edge not found')
-        except:
-            raise
+        self.edge_count -= 1
+        self._edges = None
+        # Delete isolated nodes
+        if self.order(edge.u) == 0:
+            self._forget(edge.u)
+        if self.order(edge.v) == 0:
+            self._forget(edge.v)
 
     def order(self, node):
         """ Give the node order """
-        return len(self[node])
+        return len(self.nodes.get(node, ()))
 
     def get_mst_kruskal(self):
         """ Give the edges of the minimum spanning tree using Kruskal algorithm
         """
         edges = self.get_edges()
-        edges.sort(key=lambda e: e.weight)
-        forest = graph_utils.UnionFind()
-        for e in edges:
-            if forest[e.u] != forest[e.v]:
-                yield e
-                forest.union(e.u, e.v)
-        del forest
+        nodes, us, vs, ws = self.get_edge_arrays()
+        for k in graph_utils.MST.kruskal(len(nodes), us, vs, ws):
+            yield edges[k]
+
+    @staticmethod
+    def from_arrays(nodes, us, vs, ws):
+        """ Build the CSRGraph of the given nodes whose k-th edge joins
+        nodes[us[k]] and nodes[vs[k]] with weight ws[k] """
+        return CSRGraph(nodes, us, vs, ws)
 
     @staticmethod
     def read(filename):
         """ Read a graph object from a file """
         import pickle
 
-        f = open(filename, 'r')
+        f = open(filename, 'rb')
         obj = pickle.load(f)
-        if type(obj) is Graph:
+        f.close()
+        if isinstance(obj, Graph):
             return obj
         else:
             raise GraphError('wtf r u trying to read?')
-        f.close()
-        return obj
+
+    def __setstate__(self, state):
+        """ Restore a pickled graph. The graphs written before the adjacency
+        dicts held {node: [neighbors]} and {(u, v): edge}, and are rebuilt
+        """
+        if 'edges' not in state or not isinstance(state['edges'], dict):
+            self.__dict__.update(state)
+            return
+        state = dict(state)
+        nodes, edges = state.pop('nodes'), state.pop('edges')
+        self.__init__()
+        self.__dict__.update(state)
+        for node in nodes:
+            Graph.add_node(self, node)
+        for edge in set(edges.itervalues()):
+            Graph.add_edge(self, edge)
 
     def write(self, filename):
         """ Write a graph to a file """
         import pickle
 
-        f = open(filename, 'w')
-        pickle.dump(self, f)
+        f = open(filename, 'wb')
+        pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
         f.close()
 
     def draw(self, imagefile):
@@ -209,8 +299,7 @@ class Graph(object):
         n = {}
         for node in self:
             n[node] = G.newItem('%s' %node.label)
-        for e in self.edges:
-            edge = self.edges[e]
+        for edge in self.get_edges():
             ge = G.newLink(n[edge.u], n[edge.v])
             G.propertyAppend(ge, "arrowhead", "none")
 
@@ -225,6 +314,163 @@ class Graph(object):
         G.layout()
         G.draw(imagefile)
 
+class CSRGraph(Graph):
+    """
+    A read-only graph over a fixed list of nodes, numbered by their 'index'.
+    The edges live in three flat arrays (u, v, w), the edge k joining the
+    nodes of numbers u[k] and v[k], and the adjacency in compressed sparse
+    row form with sorted neighbors, so about 32 bytes are used per edge.
+
+    Edge objects are created only when asked for and then kept, so the same
+    object is always given for the same edge. Loops are dropped and, for
+    parallel edges, the lightest one is kept.
+    """
+
+    def __init__(self, nodes, us, vs, ws):
+        self.node_list = list(nodes)
+        for i, node in enumerate(self.node_list):
+            node.index = i
+        self.labels = dict((node.label, node) for node in self.node_list)
+        self._cache = {}
+        self._edges = None
+
+        n = len(self.node_list)
+        us, vs, ws = array('i', us), array('i', vs), array('d', ws)
+        self.indptr, self.adj, self.eid = CSRGraph._sorted_rows(n, us, vs)
+        drop = self._parallel_edges(ws)
+        if drop:
+            ids = [k for k in xrange(len(us)) if k not in drop]
+            us = array('i', [us[k] for k in ids])
+            vs = array('i', [vs[k] for k in ids])
+            ws = array('d', [ws[k] for k in ids])
+            self.indptr, self.adj, self.eid = CSRGraph._sorted_rows(n, us,
+                    vs)
+        self.u, self.v, self.w = us, vs, ws
+        self.edge_count = len(us)
+
+    @staticmethod
+    def _sorted_rows(n, us, vs):
+        """ Give the CSR arrays of the edges with the neighbors of each node
+        sorted, for the binary searches of get_edge """
+        indptr, adj, eid = csr_arrays(n, us, vs)
+        for i in xrange(n):
+            lo, hi = indptr[i], indptr[i + 1]
+            row = adj[lo:hi]
+            if any(row[k] > row[k + 1] for k in xrange(len(row) - 1)):
+                pairs = sorted(izip(row, eid[lo:hi]))
+                adj[lo:hi] = array('i', [p[0] for p in pairs])
+                eid[lo:hi] = array('i', [p[1] for p in pairs])
+        return indptr, adj, eid
+
+    def _parallel_edges(self, ws):
+        """ Give the set of the loops and of the parallel edges but the
+        lightest, found next to each other in the sorted rows """
+        drop = set()
+        adj, eid, indptr = self.adj, self.eid, self.indptr
+        for i in xrange(len(indptr) - 1):
+            lo, hi = indptr[i], indptr[i + 1]
+            row = adj[lo:hi]
+            if i not in row and len(set(row)) == hi - lo:
+                continue
+            prev = best = None
+            for p in xrange(lo, hi):
+                j, k = adj[p], eid[p]
+                if j == i:
+                    drop.add(k)
+                elif j != prev:
+                    prev, best = j, k
+                elif ws[k] < ws[best]:
+                    drop.add(best)
+                    best = k
+                else:
+                    drop.add(k)
+        return drop
+
+    def __iter__(self):
+        return iter(self.node_list)
+
+    def __len__(self):
+        return len(self.node_list)
+
+    def __contains__(self, node):
+        try:
+            return self.node_list[node.index] is node
+        except (AttributeError, IndexError, TypeError):
+            return False
+
+    def __getitem__(self, node):
+        if node not in self:
+            return []
+        i = node.index
+        nodes = self.node_list
+        return [nodes[j] for j in self.adj[self.indptr[i]:self.indptr[i+1]]]
+
+    def copy(self):
+        g = Graph()
+        map(lambda n: g.add_node(n), self.node_list)
+        map(lambda e: g.add_edge(e), self.get_edges())
+        return g
+
+    def get_nodes(self):
+        return list(self.node_list)
+
+    def get_edges(self):
+        if self._edges is None:
+            self._edges = [self._edge(k) for k in xrange(self.edge_count)]
+        return self._edges
+
+    def get_edge_arrays(self, nodes=None):
+        if nodes is None or nodes == self.node_list:
+            return (self.node_list, self.u, self.v, self.w)
+        index = dict((x, i) for i, x in enumerate(nodes))
+        perm = [index[x] for x in self.node_list]
+        return (nodes, array('i', [perm[a] for a in self.u]),
+                array('i', [perm[b] for b in self.v]), self.w)
+
+    def _edge(self, k):
+        """ Give the Edge object of number k """
+        try:
+            return self._cache[k]
+        except KeyError:
+            nodes = self.node_list
+            e = Edge(nodes[self.u[k]], nodes[self.v[k]], self.w[k], k)
+            self._cache[k] = e
+            return e
+
+    def get_edge_by_id(self, k):
+        """ Give the edge of number k, the one whose 'id' is k """
+        return self._edge(k)
+
+    def get_edge(self, u, v):
+        if u not in self or v not in self:
+            return None
+        j = v.index
+        lo, hi = self.indptr[u.index], self.indptr[u.index + 1]
+        p = bisect_left(self.adj, j, lo, hi)
+        if p < hi and self.adj[p] == j:
+            return self._edge(self.eid[p])
+        return None
+
+    def has_edge(self, u, v):
+        return self.get_edge(u, v) is not None
+
+    def order(self, node):
+        if node not in self:
+            return 0
+        return self.indptr[node.index + 1] - self.indptr[node.index]
+
+    def add_node(self, node):
+        raise GraphError('CSRGraph is read-only')
+
+    def add_edge(self, edge):
+        raise GraphError('CSRGraph is read-only')
+
+    def del_node(self, node):
+        raise GraphError('CSRGraph is read-only')
+
+    def del_edge(self, edge):
+        raise GraphError('CSRGraph is read-only')
+
 class Tree(Graph):
 
     def __init__(self):
@@ -260,8 +506,10 @@ class SteinerTree(Tree):
 
     def copy(self):
         st = SteinerTree()
-        map(lambda e: st.add_edge(e), self.get_edges())
-        map(lambda t: st.add_terminal(t), self.terminals)
+        st.nodes = dict((n, dict(adj)) for n, adj in self.nodes.iteritems())
+        st.labels = dict(self.labels)
+        st.edge_count = self.edge_count
+        st.terminals = dict(self.terminals)
         st.cost = self.cost
         return st
 
@@ -298,7 +546,7 @@ class SteinerTree(Tree):
 
     def del_useless_edges(self):
         nodes = self.get_nodes()
-        nodes.sort(key=lambda o: len(self[o]))
+        nodes.sort(key=self.order)
         for node in nodes:
             if self.is_leaf(node) and node not in self.terminals:
                 self.del_node(node)
@@ -323,8 +571,7 @@ class SteinerTree(Tree):
             n[node] = G.newItem('%s' %str(node.label))
             if node in self.terminals:
                 G.styleApply("terminal", n[node])
-        for e in self.edges:
-            edge = self.edges[e]
+        for edge in self.get_edges():
             ge = G.newLink(n[edge.u], n[edge.v])
             G.propertyAppend(ge, "arrowhead", "none")
 
@@ -338,3 +585,204 @@ class SteinerTree(Tree):
         G.from_string(dottext)
         G.layout()
         G.draw(imagefile)
+
+class ArrayTree(object):
+    """
+    A Steiner tree of a CSRGraph held in flat arrays over the node and edge
+    numbers of the graph: membership flags of the nodes and of the edges, the
+    degree of each node and the list of the tree edges. It answers the same
+    queries as SteinerTree and is changed by the same add_edge and del_edge
+    calls, with the graph's Edge objects, so Move works on both.
+
+    'link' holds, for each node, the XOR of the numbers of its tree edges: the
+    edge of a leaf is found without looking at its neighbors. The parent
+    array is computed when asked for and kept until the tree changes.
+    """
+
+    def __init__(self, graph, terminals=()):
+        n = len(graph)
+        m = graph.get_edge_count()
+        self.graph = graph
+        self.node_in = bytearray(n)
+        self.terminal = bytearray(n)
+        self.edge_in = bytearray(m)
+        self.degree = array('i', [0]) * n
+        self.link = array('i', [0]) * n
+        # The tree edges, and the position of each one in that list
+        self.edges = array('i')
+        self.pos = array('i', [-1]) * m
+        self.cost = 0
+        self.parent = None
+        self.bfs = None
+        for t in terminals:
+            self.add_terminal(t)
+
+    @staticmethod
+    def from_tree(graph, tree):
+        """ Give the ArrayTree of a SteinerTree of the graph """
+        st = ArrayTree(graph, tree.get_terminals())
+        for e in tree.get_edges():
+            st.add_edge(graph.get_edge(e.u, e.v))
+        return st
+
+    def to_tree(self):
+        """ Give the tree as a SteinerTree """
+        st = SteinerTree()
+        for e in self.get_edges():
+            st.add_edge(e)
+        for t in self.get_terminals():
+            st.add_terminal(t)
+        return st
+
+    def copy(self):
+        st = ArrayTree.__new__(ArrayTree)
+        st.graph = self.graph
+        st.node_in = bytearray(self.node_in)
+        st.terminal = bytearray(self.terminal)
+        st.edge_in = bytearray(self.edge_in)
+        st.degree = array('i', self.degree)
+        st.link = array('i', self.link)
+        st.edges = array('i', self.edges)
+        st.pos = array('i', self.pos)
+        st.cost = self.cost
+        st.parent = st.bfs = None
+        return st
+
+    def __contains__(self, node):
+        return node in self.graph and self.node_in[node.index] == 1
+
+    def __len__(self):
+        """ The number of nodes """
+        return len(self.edges) + 1 if self.edges else \
+                self.node_in.count('\x01')
+
+    def __getitem__(self, node):
+        """ Return the node's neighbors in the tree """
+        if node not in self:
+            return []
+        nodes, u, v = self.graph.node_list, self.graph.u, self.graph.v
+        i = node.index
+        return [nodes[v[k] if u[k] == i else u[k]] for k in self.edges
+                if u[k] == i or v[k] == i]
+
+    def get_nodes(self):
+        nodes = self.graph.node_list
+        return [nodes[i] for i in xrange(len(nodes)) if self.node_in[i]]
+
+    def get_edges(self):
+        edge = self.graph._edge
+        return [edge(k) for k in self.edges]
+
+    def get_edge(self, u, v):
+        e = self.graph.get_edge(u, v)
+        if e is not None and self.edge_in[e.id]:
+            return e
+        return None
+
+    def get_terminals(self):
+        nodes = self.graph.node_list
+        return [nodes[i] for i in xrange(len(nodes)) if self.terminal[i]]
+
+    def add_terminal(self, node):
+        self.terminal[node.index] = 1
+        self.node_in[node.index] = 1
+
+    def is_terminal(self, node):
+        return self.terminal[node.index] == 1
+
+    def order(self, node):
+        return self.degree[node.index]
+
+    def get_cost(self):
+        return self.cost
+
+    def add_edge(self, e):
+        k = e.id
+        if self.edge_in[k]:
+            return False
+        self.edge_in[k] = 1
+        self.pos[k] = len(self.edges)
+        self.edges.append(k)
+        for i in (self.graph.u[k], self.graph.v[k]):
+            self.degree[i] += 1
+            self.link[i] ^= k
+            self.node_in[i] = 1
+        self.cost += self.graph.w[k]
+        self.parent = self.bfs = None
+        return True
+
+    def del_edge(self, e):
+        k = e.id
+        if not self.edge_in[k]:
+            raise GraphError('Edge not found')
+        self.edge_in[k] = 0
+        # Move the last edge of the list to the place of the removed one
+        p = self.pos[k]
+        last = self.edges.pop()
+        if last != k:
+            self.edges[p] = last
+            self.pos[last] = p
+        self.pos[k] = -1
+        for i in (self.graph.u[k], self.graph.v[k]):
+            self.degree[i] -= 1
+            self.link[i] ^= k
+            if self.degree[i] == 0 and not self.terminal[i]:
+                self.node_in[i] = 0
+        self.cost -= self.graph.w[k]
+        self.parent = self.bfs = None
+
+    def del_useless_edges(self):
+        """ Remove the non terminal leaves until there are none """
+        u, v, degree, terminal = \
+                self.graph.u, self.graph.v, self.degree, self.terminal
+        stack = [i for k in self.edges for i in (u[k], v[k])
+                if degree[i] == 1 and not terminal[i]]
+        edge = self.graph._edge
+        while stack:
+            i = stack.pop()
+            if degree[i] != 1 or terminal[i]:
+                continue
+            k = self.link[i]
+            self.del_edge(edge(k))
+            stack.append(v[k] if u[k] == i else u[k])
+
+    def get_parents(self):
+        """ Give (parent, order): the parent of each node number when the
+        tree is rooted on one of its nodes, -1 for the root and the nodes out
+        of the tree, and the tree nodes in breadth first order """
+        if self.parent is not None:
+            return self.parent, self.bfs
+        u, v = self.graph.u, self.graph.v
+        adjacent = {}
+        for k in self.edges:
+            adjacent.setdefault(u[k], []).append(v[k])
+            adjacent.setdefault(v[k], []).append(u[k])
+        parent = array('i', [-1]) * len(self.degree)
+        order = []
+        if adjacent:
+            root = u[self.edges[0]]
+            order.append(root)
+            for x in order:
+                for y in adjacent[x]:
+                    if y != parent[x]:
+                        parent[y] = x
+                        order.append(y)
+        self.parent, self.bfs = parent, order
+        return parent, order
+
+    def split(self, e):
+        """ Give the node numbers of the two components left when the tree
+        edge e is removed, the one holding e.u first """
+        parent, order = self.get_parents()
+        a, b = e.u.index, e.v.index
+        child = b if parent[b] == a else a
+        below = bytearray(len(self.degree))
+        below[child] = 1
+        for x in order:
+            if parent[x] >= 0 and below[parent[x]]:
+                below[x] = 1
+        side_child = [x for x in order if below[x]]
+        side_parent = [x for x in order if not below[x]]
+        if child == b:
+            return side_parent, side_child
+        return side_child, side_parent
@@ -1,5 +1,10 @@
 import graph as Graph
 import random
+import heapq
+from array import array
+from itertools import izip
+from collections import OrderedDict
+from operator import itemgetter
 
 class UnionFind(object):
     """
@@ -49,74 +54,460 @@ class UnionFind(object):
             self.parent[y_root] = x_root
             self.rank[x_root] += 1
 
-class FloydWarshall(object):
-    """ Give the all-pairs shortest path on a graph """
+class ArrayUnionFind(object):
+    """
+    Disjoint sets of the integers 0..n-1 held in two arrays. Find halves the
+    paths it walks and union links the root of lower rank under the other one,
+    so both are O(alfa(n)) amortized. Unlike UnionFind, nothing is added by a
+    lookup.
+    """
 
-    def __init__(self, graph):
-        import floydwarshall as fw
+    def __init__(self, n):
+        self.parent = array('i', xrange(n))
+        self.rank = bytearray(n)
 
-        n = len(graph)
+    def find(self, x):
+        """ Return the representant of the set that contains x """
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
 
-        m_adj = fw.new_doubleArray(n*n)
-        dist  = fw.new_doubleArray(n*n)
-        pred  = fw.new_intArray(n*n)
+    def union(self, x, y):
+        """ Merge the sets containing x and y. Return False if they were the
+        same set """
+        x = self.find(x)
+        y = self.find(y)
+        if x == y:
+            return False
+        if self.rank[x] < self.rank[y]:
+            x, y = y, x
+        self.parent[y] = x
+        if self.rank[x] == self.rank[y]:
+            self.rank[x] += 1
+        return True
+
+class MST(object):
+    """ Minimum spanning trees (forests, if the graph is not connected) of
+    graphs given by integer arrays """
 
-        nodes = graph.get_nodes()
-        k = {}
+    @staticmethod
+    def kruskal(n, us, vs, ws):
+        """ Give the numbers of the edges of the minimum spanning forest of
+        the graph of n nodes whose edge k joins us[k] and vs[k] with weight
+        ws[k] """
+        forest = ArrayUnionFind(n)
+        union = forest.union
+        tree = array('i')
+        for k in sorted(xrange(len(ws)), key=ws.__getitem__):
+            if union(us[k], vs[k]):
+                tree.append(k)
+                if len(tree) == n - 1:
+                    break
+        return tree
 
-        for i, v in enumerate( nodes ):
-            k[v] = i
+    @staticmethod
+    def prim(n, row):
+        """ Give the parent of each node in the minimum spanning forest of the
+        complete graph of n nodes, -1 for the roots. row(i) gives the weights
+        of the edges from i to all the nodes, so the n*n edges are never held
+        at once. It is O(n^2) """
+        inf = float('inf')
+        key = [inf] * n
+        parent = array('i', [-1]) * n
+        left = range(n)
+        while left:
+            # The closest node to the tree, or a new root
+            p = min(xrange(len(left)), key=lambda p: key[left[p]])
+            u = left[p]
+            left[p] = left[-1]
+            left.pop()
+            weights = row(u)
+            for v in left:
+                if weights[v] < key[v]:
+                    key[v] = weights[v]
+                    parent[v] = u
+        return parent
+
+class PathCache(object):
+    """
+    Least recently used cache of the expanded shortest paths, keyed by the
+    pair of node numbers of their ends. A path is kept as an array of node
+    numbers and is also used reversed for the reversed pair.
 
-        # Adjacent matrix
-        for i in xrange(n*n):
-            fw.doubleArray_setitem(m_adj, i, 0)
-        for e in graph.edges:
-            fw.doubleArray_setitem(m_adj, k[e[0]]*n+k[e[1]],
-                    graph.edges[e].weight)
-
-        fw.floydwarshall(n, m_adj, dist, pred)
-
-        self.dist = {}
-        self.pred = {}
-
-        for i in xrange(n*n):
-            u = nodes[i/n]
-            v = nodes[i%n]
-            self.dist[(u,v)] = fw.doubleArray_getitem(dist, i)
-            p = fw.intArray_getitem(pred, i)
-            if p > -1:
-                self.pred[(u,v)] = nodes[p]
-            else:
-                self.pred[(u,v)] = None
+    The memory used is bounded by 'max_bytes', counted with the size of the
+    arrays plus a fixed overhead per entry. 'hits' and 'misses' count the
+    lookups since the cache was made.
+    """
+
+    # Bytes used by an entry besides its node numbers: the key tuple, the
+    # array header and the slot in the ordered dict
+    ENTRY_BYTES = 200
+    # Enough for hundreds of thousands of the short paths of world666
+    MAX_BYTES = 64 << 20
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes if max_bytes is not None else \
+                PathCache.MAX_BYTES
+        self.paths = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.paths)
+
+    def get(self, s, t):
+        """ Give the path from s to t, or None if it is not cached """
+        key = (s, t)
+        path = self.paths.pop(key, None)
+        if path is None:
+            key = (t, s)
+            path = self.paths.pop(key, None)
+            if path is None:
+                self.misses += 1
+                return None
+        # Put it back as the most recently used
+        self.paths[key] = path
+        self.hits += 1
+        return path if key[0] == s else path[::-1]
+
+    def put(self, s, t, path):
+        size = PathCache.ENTRY_BYTES + path.itemsize * len(path)
+        if size > self.max_bytes:
+            return
+        old = self.paths.pop((s, t), None)
+        if old is not None:
+            self.bytes -= PathCache.ENTRY_BYTES + old.itemsize * len(old)
+        self.paths[(s, t)] = path
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            key, old = self.paths.popitem(last=False)
+            self.bytes -= PathCache.ENTRY_BYTES + old.itemsize * len(old)
+
+    def clear(self):
+        self.paths.clear()
+        self.bytes = 0
+
+    def get_stats(self):
+        """ Give the lookups, hits, hit rate, entries and bytes used """
+        lookups = self.hits + self.misses
+        return {'lookups': lookups, 'hits': self.hits,
+                'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+                'entries': len(self.paths), 'bytes': self.bytes}
+
+class ShortestPaths(object):
+    """
+    Base class of the shortest path engines. An engine answers get_dist and
+    get_min_path queries between the nodes of the graph it was built for.
+
+    The nodes are numbered by their position in 'self.nodes', which is the
+    given list of nodes or the graph's own order, and 'self.index' gives the
+    number of a node.
+
+    The expanded paths are kept in 'self.cache', a PathCache, so asking again
+    for the path between the same nodes does not walk the predecessors again.
+    """
+
+    # Graphs with a smaller fraction of the possible edges are sparse
+    SPARSE_DENSITY = 0.1
+    # Above this number of nodes the n*n matrices are not worth it
+    MAX_DENSE_NODES = 3000
+
+    def __init__(self, graph, nodes=None):
+        if nodes is None:
+            nodes = graph.get_nodes()
+        self.graph = graph
+        self.nodes = list(nodes)
+        self.index = dict((v, i) for i, v in enumerate(self.nodes))
+        self.n = len(self.nodes)
+        self.cache = PathCache()
+
+    @staticmethod
+    def get(graph, shared=False, nodes=None):
+        """ Give the engine that suits the graph: Floyd-Warshall for dense
+        graphs and lazy Dijkstra for sparse or very large ones.
+
+        With 'shared', the Floyd-Warshall matrices are put in shared memory,
+        so processes forked afterwards read them without any copy """
+        n = len(graph)
+        m = graph.get_edge_count()
+        if n > ShortestPaths.MAX_DENSE_NODES or \
+        m < ShortestPaths.SPARSE_DENSITY * n * (n - 1) / 2:
+            return Dijkstra(graph, nodes)
+        if shared:
+            from multiprocessing.sharedctypes import RawArray
+            return FloydWarshall(graph, RawArray('d', n*n), RawArray('i', n*n),
+                    nodes)
+        return FloydWarshall(graph, nodes=nodes)
+
+    def get_dist(self, i, j):
+        """ Get the cost of the minimum path between nodes i and j """
+        raise NotImplementedError
+
+    def get_size(self):
+        """ Estimate the bytes used now by the engine, its paths included """
+        return self.cache.bytes
+
+    def clear(self):
+        """ Forget what was kept to answer faster: the expanded paths """
+        self.cache.clear()
 
     def get_min_path(self, i, j):
-        """ Get the minimum path between nodes i and j """
-        p = self.__getpath(i, j)
-        if p is None:
+        """ Get the minimum path between nodes i and j. The paths are expanded
+        once and then read from the cache while they are in it """
+        try:
+            s, t = self.index[i], self.index[j]
+        except KeyError:
             return []
+        path = self.cache.get(s, t)
+        if path is None:
+            path = self._expand(s, t)
+            self.cache.put(s, t, path)
+        return map(self.nodes.__getitem__, path)
+
+    def get_path_edges(self, i, j):
+        """ Yield the edges of the minimum path between nodes i and j """
+        path = self.get_min_path(i, j)
+        get_edge = self.graph.get_edge
+        for k in xrange(len(path) - 1):
+            yield get_edge(path[k], path[k+1])
+
+    def get_paths_edge_ids(self, pairs):
+        """ Give the ids of the edges of the minimum paths between the given
+        pairs of nodes, one after the other in a single array. An edge shared
+        by several paths is given once for each of them. The edges must be
+        numbered, as the ones of a CSRGraph are """
+        ids = array('i')
+        for i, j in pairs:
+            ids.extend(e.id for e in self.get_path_edges(i, j))
+        return ids
+
+    def _expand(self, s, t):
+        """ Give the array of the node numbers of the minimum path from s to
+        t, empty if there is none """
+        raise NotImplementedError
+
+    def get_row(self, i):
+        """ Give the distances from the node of index i to all the nodes, as a
+        sequence indexed by node number """
+        raise NotImplementedError
+
+    def get_closest_pair(self, sources, targets, exclude=None):
+        """
+        Give (cost, u, v) for the cheapest path between a node u of sources
+        and a node v of targets, or None if no target can be reached. The pair
+        'exclude', if given, is not considered.
+
+        Only distances are read: one row per node of the smaller set, from
+        which the columns of the other set are picked at once.
+        """
+        sources = list(sources)
+        targets = list(targets)
+        swap = len(targets) < len(sources)
+        if swap:
+            sources, targets = targets, sources
+            if exclude is not None:
+                exclude = (exclude[1], exclude[0])
+
+        index = self.index
+        columns = [index[v] for v in targets]
+        if len(columns) == 1:
+            pick = lambda row: (row[columns[0]], )
         else:
-            return [i, ] + p + [j, ]
+            pick = itemgetter(*columns)
+
+        inf = float('inf')
+        best = (inf, None, None)
+        for u in sources:
+            values = pick(self.get_row(index[u]))
+            if exclude is not None and u == exclude[0] and \
+            exclude[1] in targets:
+                values = list(values)
+                values[targets.index(exclude[1])] = inf
+            cost = min(values)
+            if cost < best[0]:
+                best = (cost, u, targets[values.index(cost)])
+
+        if best[1] is None:
+            return None
+        if swap:
+            return (best[0], best[2], best[1])
+        return best
+
+class FloydWarshall(ShortestPaths):
+    """ Give the all-pairs shortest path on a graph.
+
+    Distances and predecessors are kept in two flat typed arrays of n*n cells,
+    indexed by the position of the nodes in 'self.nodes'. Nothing is created
+    per pair of nodes: queries read straight from the arrays.
+
+    Any writable buffers of n*n doubles and ints may be given to hold the
+    distances and the predecessors. With 'ready' they already hold the result
+    for the given order of the nodes, e.g. when loaded from a cache, and
+    nothing is computed """
+
+    def __init__(self, graph, dist=None, pred=None, nodes=None, ready=False):
+        ShortestPaths.__init__(self, graph, nodes)
+        if ready:
+            self.dist = dist
+            self.pred = pred
+            return
+
+        import floydwarshall as fw
+
+        n = self.n
 
-    def __getpath(self, i, j):
+        # Adjacent matrix
+        m_adj = array('d', [0.0]) * (n*n)
+        nodes, us, vs, ws = graph.get_edge_arrays(self.nodes)
+        for u, v, w in izip(us, vs, ws):
+            m_adj[u*n+v] = w
+            m_adj[v*n+u] = w
+
+        # The kernel fills the arrays in place
+        if dist is None:
+            dist = array('d', [0.0]) * (n*n)
+        if pred is None:
+            pred = array('i', [0]) * (n*n)
+        self.dist = dist
+        self.pred = pred
+        fw.floydwarshall_buffer(n, m_adj, self.dist, self.pred)
+
+    def get_dist(self, i, j):
+        """ Get the cost of the minimum path between nodes i and j """
+        return self.dist[self.index[i]*self.n + self.index[j]]
+
+    def get_size(self):
+        return 12 * self.n * self.n + ShortestPaths.get_size(self)
+
+    def get_row(self, i):
+        """ Give the distances from the node of index i """
+        return self.dist[i*self.n:(i+1)*self.n]
+
+    def _expand(self, s, t):
+        # The node before t is read from the row of s, back to s itself
+        path = array('i')
+        pred = self.pred
+        row = s*self.n
+        if pred[row + t] < 0:
+            return path
+        path.append(t)
+        while t != s:
+            t = pred[row + t]
+            path.append(t)
+        path.reverse()
+        return path
+
+    def get_path_edges(self, i, j):
+        """ Yield the edges of the minimum path between nodes i and j, from j
+        back to i, straight from the predecessors """
         try:
-            if self.pred[(i, j)] is None:
-                return None
-            elif self.pred[(i, j)] == i:
-                return []
-            else:
-                k = self.pred[(i, j)]
-                return self.__getpath(i, k) + [k, ] + self.__getpath(k, j)
+            s, t = self.index[i], self.index[j]
         except KeyError:
-            return None
+            return
+        nodes, pred, get_edge = self.nodes, self.pred, self.graph.get_edge
+        row = s*self.n
+        if pred[row + t] < 0:
+            return
+        while t != s:
+            p = pred[row + t]
+            yield get_edge(nodes[p], nodes[t])
+            t = p
+
+class Dijkstra(ShortestPaths):
+    """ Give the shortest paths on a sparse graph.
+
+    A binary heap Dijkstra is run from a source only when a path starting or
+    ending at it is asked for. The resulting shortest path tree is cached, so
+    the work done is proportional to the number of distinct sources, usually
+    the nodes of the Steiner trees, instead of n^3 """
+
+    def __init__(self, graph, nodes=None):
+        ShortestPaths.__init__(self, graph, nodes)
+        nodes, us, vs, self.w = graph.get_edge_arrays(self.nodes)
+        self.indptr, self.adj, self.eid = Graph.csr_arrays(self.n, us, vs)
+        # Source index -> (dist, pred) arrays of its shortest path tree
+        self.trees = {}
+
+    def get_tree(self, s):
+        """ Give the distance and predecessor arrays from the source of index
+        s. pred holds the previous node on the path, or -1 """
+        try:
+            return self.trees[s]
+        except KeyError:
+            pass
+
+        inf = float('inf')
+        dist = array('d', [inf]) * self.n
+        pred = array('i', [-1]) * self.n
+        indptr, adj, eid, w = self.indptr, self.adj, self.eid, self.w
+        dist[s] = 0.0
+        heap = [(0.0, s)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            for p in xrange(indptr[u], indptr[u+1]):
+                v = adj[p]
+                nd = d + w[eid[p]]
+                if nd < dist[v]:
+                    dist[v] = nd
+                    pred[v] = u
+                    heapq.heappush(heap, (nd, v))
+
+        self.trees[s] = (dist, pred)
+        return dist, pred
+
+    def get_size(self):
+        # The CSR arrays, the weights and the dist and pred arrays of each
+        # tree
+        return 4 * self.n + 12 * len(self.adj) + 12 * self.n * \
+                len(self.trees) + ShortestPaths.get_size(self)
+
+    def clear(self):
+        """ Forget the expanded paths and the shortest path trees """
+        ShortestPaths.clear(self)
+        self.trees.clear()
+
+    def get_dist(self, i, j):
+        """ Get the cost of the minimum path between nodes i and j """
+        s, t = self.index[i], self.index[j]
+        if s not in self.trees and t in self.trees:
+            s, t = t, s
+        return self.get_tree(s)[0][t]
+
+    def get_row(self, i):
+        """ Give the distances from the node of index i """
+        return self.get_tree(i)[0]
+
+    def _expand(self, s, t):
+        path = array('i')
+        if s == t:
+            return path
+
+        # Walking the tree of t from s gives the path already in order
+        if t in self.trees or s not in self.trees:
+            dist, pred = self.get_tree(t)
+            if pred[s] < 0:
+                return path
+            path.append(s)
+            while path[-1] != t:
+                path.append(pred[path[-1]])
+        else:
+            dist, pred = self.trees[s]
+            if pred[t] < 0:
+                return path
+            path.append(t)
+            while path[-1] != s:
+                path.append(pred[path[-1]])
+            path.reverse()
+        return path
 
 class Helper(object):
     """ A class that implement some methods used by other classes """
 
-    @staticmethod
-    def get_path_cost(graph, path):
-        return reduce(lambda a, b: a+b, [e.weight for e in [graph.get_edge(u,
-            path[i+1]) for i, u in enumerate(path[:-1])]])
-
     @staticmethod
     def make_tree_from_kruskal(graph, terminals):
         st = Graph.SteinerTree()
@@ -126,6 +517,26 @@ class Helper(object):
 
         return st
 
+    @staticmethod
+    def make_tree_from_paths(edges, terminals):
+        """ Give the SteinerTree made of the minimum spanning tree of the
+        given edges, without its non terminal leaves """
+        nodes = {}
+        for e in edges:
+            nodes.setdefault(e.u, len(nodes))
+            nodes.setdefault(e.v, len(nodes))
+        us = array('i', [nodes[e.u] for e in edges])
+        vs = array('i', [nodes[e.v] for e in edges])
+        ws = array('d', [e.weight for e in edges])
+        st = Graph.SteinerTree()
+        for t in terminals:
+            st.add_terminal(t)
+        for k in MST.kruskal(len(nodes), us, vs, ws):
+            st.add_edge(edges[k])
+        st.del_useless_edges()
+
+        return st
+
 class HAlgorithm(object):
     """
     This algorithm is used to find a Steiner tree of a given graph. Its
@@ -133,46 +544,231 @@ class HAlgorithm(object):
     in the minimal Steiner tree.
 
     Input: an undirected weighted graph G=(V, E, d), a list of terminal nodes
-    S conteined or equal to V and a FloydWarshall instance with all the minimum
-    path on the graph.
+    S conteined or equal to V and a ShortestPaths engine (FloydWarshall or
+    Dijkstra) giving the minimum paths on the graph.
 
     Output: a SteinerTree object for G and S
     """
 
-    def __init__(self, graph, terminals, floydwarshall):
+    def __init__(self, graph, terminals, paths):
         self.graph = graph
         self.terminals = terminals
-        self.min_path = floydwarshall.get_min_path
+        self.paths = paths
+        self.min_path = paths.get_min_path
 
     def get_steiner_tree(self):
-        # Create the complete graph with terminal nodes
-        complete = self.__complete_terminal_graph()
-        # Get a graph changing the edges of the complete graph by minimum paths
-        subst = self.__subst_shortest_paths(complete)
-        del complete
-        # Get the minimum spanning tree
-        mst = Helper.make_tree_from_kruskal(subst, self.terminals)
-        del subst
-        mst.del_useless_edges()
-
-        return mst
-
-    def __complete_terminal_graph(self):
-        g = Graph.Graph()
-        for i in self.terminals:
-            for j in [j for j in self.terminals if j != i]:
-                cost = Helper.get_path_cost(self.graph, self.min_path(i, j))
-                g.add_edge(Graph.Edge(i, j, cost))
-        return g
-
-    def __subst_shortest_paths(self, g):
-        tree = Graph.Tree()
-        for e in g.get_mst_kruskal():
-            path = self.min_path(e.u, e.v)
-            for i, u in enumerate(path[:-1]):
-                edge = self.graph.get_edge(u, path[i+1])
-                tree.add_edge(edge)
-        return tree
+        terminals = list(self.terminals)
+        # Minimum spanning tree of the complete graph of the terminals, whose
+        # edges weight the minimum paths. Its edges are never built: Prim asks
+        # for the distances one terminal at a time
+        index = self.paths.index
+        columns = [index[t] for t in terminals]
+
+        def row(i):
+            r = self.paths.get_row(columns[i])
+            return [r[j] for j in columns]
+
+        parent = MST.prim(len(terminals), row)
+
+        # Change its edges by the minimum paths
+        pairs = [(terminals[p], terminals[i]) for i, p in enumerate(parent)
+                if p >= 0]
+        if isinstance(self.graph, Graph.CSRGraph):
+            ids = sorted(set(self.paths.get_paths_edge_ids(pairs)))
+            edges = map(self.graph.get_edge_by_id, ids)
+        else:
+            edges = {}
+            for u, v in pairs:
+                edges.update((e, None) for e in self.paths.get_path_edges(u, v))
+            edges = edges.keys()
+
+        return Helper.make_tree_from_paths(edges, terminals)
+
+class Mehlhorn(object):
+    """
+    Mehlhorn's variant of HAlgorithm, with the same 2 * (1 - 1/l) bound. A
+    single Dijkstra run from all the terminals at once splits the nodes in
+    the Voronoi regions of the terminals. Each edge joining two regions gives
+    a path between their terminals, of cost the distances of its ends to them
+    plus its weight, and the minimum spanning tree of the terminals is taken
+    over these paths only. It is O(m + n log n) and needs no shortest path
+    engine.
+
+    Input: an undirected weighted graph G=(V, E, d) and a list of terminal
+    nodes S conteined or equal to V. 'paths' is ignored; it is there so both
+    algorithms are built alike.
+
+    Output: a SteinerTree object for G and S
+    """
+
+    def __init__(self, graph, terminals, paths=None):
+        self.graph = graph
+        self.terminals = terminals
+
+    def get_voronoi(self):
+        """ Give (base, dist, pred) arrays over the node numbers of
+        graph.get_edge_arrays: the number of the closest terminal, the
+        distance to it and the number of the last edge of the path to it, -1
+        at the terminals and the nodes no terminal reaches """
+        nodes, us, vs, ws = self.graph.get_edge_arrays()
+        n = len(nodes)
+        index = dict((x, i) for i, x in enumerate(nodes))
+        indptr, adj, eid = Graph.csr_arrays(n, us, vs)
+
+        inf = float('inf')
+        dist = array('d', [inf]) * n
+        base = array('i', [-1]) * n
+        pred = array('i', [-1]) * n
+        heap = []
+        for t in self.terminals:
+            i = index[t]
+            dist[i] = 0.0
+            base[i] = i
+            heap.append((0.0, i))
+        heapq.heapify(heap)
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            for p in xrange(indptr[u], indptr[u+1]):
+                v = adj[p]
+                nd = d + ws[eid[p]]
+                if nd < dist[v]:
+                    dist[v] = nd
+                    base[v] = base[u]
+                    pred[v] = eid[p]
+                    heapq.heappush(heap, (nd, v))
+        return base, dist, pred
+
+    def get_steiner_tree(self):
+        nodes, us, vs, ws = self.graph.get_edge_arrays()
+        edges = self.graph.get_edges()
+        base, dist, pred = self.get_voronoi()
+
+        # The shortest bridge between each pair of neighbouring regions
+        bridges = {}
+        for k, u, v, w in izip(xrange(len(ws)), us, vs, ws):
+            a, b = base[u], base[v]
+            if a == b or a < 0 or b < 0:
+                continue
+            key = (a, b) if a < b else (b, a)
+            cost = dist[u] + w + dist[v]
+            if key not in bridges or cost < bridges[key][0]:
+                bridges[key] = (cost, k)
+
+        # Minimum spanning tree of the terminals over the bridges
+        pairs = bridges.keys()
+        terminals = {}
+        for a, b in pairs:
+            terminals.setdefault(a, len(terminals))
+            terminals.setdefault(b, len(terminals))
+        chosen = MST.kruskal(len(terminals),
+                array('i', [terminals[a] for a, b in pairs]),
+                array('i', [terminals[b] for a, b in pairs]),
+                array('d', [bridges[p][0] for p in pairs]))
+
+        # Each bridge and the paths from its ends back to their terminals
+        path = {}
+        for j in chosen:
+            k = bridges[pairs[j]][1]
+            path[k] = None
+            for x in (us[k], vs[k]):
+                while pred[x] >= 0 and pred[x] not in path:
+                    path[pred[x]] = None
+                    e = pred[x]
+                    x = vs[e] if us[e] == x else us[e]
+
+        return Helper.make_tree_from_paths([edges[k] for k in path],
+                self.terminals)
+
+class Move(object):
+    """
+    A change of a SteinerTree described by the edges it removes and the edges
+    it adds. 'delta' is the variation of the tree cost once the move is
+    applied, so it can be evaluated without touching the tree.
+    """
+
+    def __init__(self, removed, added):
+        self.removed = removed
+        self.added = added
+        self.delta = sum(e.weight for e in added) - \
+                sum(e.weight for e in removed)
+
+    def apply(self, tree):
+        """ Change the tree in place """
+        for e in self.removed:
+            tree.del_edge(e)
+        for e in self.added:
+            tree.add_edge(e)
+
+    def rollback(self, tree):
+        """ Undo the move on a tree it was applied to """
+        for e in self.added:
+            tree.del_edge(e)
+        for e in self.removed:
+            tree.add_edge(e)
+
+class Exchange(Move):
+    """
+    The Move of Neighborhood.propose: the tree edge 'edge' is replaced by the
+    shortest path between the nodes u and v of the two components it joined,
+    and the non terminal leaves left are pruned. Its delta comes from the
+    distance between u and v and the weights of the pruned tree edges, so the
+    path is expanded, and the edges removed and added are known, only when
+    the move is applied or they are asked for.
+    """
+
+    def __init__(self, graph, tree, fw, edge, sides, u, v, delta):
+        self.graph = graph
+        self.tree = tree
+        self.fw = fw
+        self.edge = edge
+        self.sides = sides
+        self.u = u
+        self.v = v
+        self.delta = delta
+        self._removed = None
+        self._added = None
+
+    @property
+    def removed(self):
+        if self._removed is None:
+            self.expand()
+        return self._removed
+
+    @property
+    def added(self):
+        if self._added is None:
+            self.expand()
+        return self._added
+
+    def expand(self):
+        """ Find the edges of the move. The tree must be the one the move was
+        proposed for, still unchanged """
+        side_a, side_b = self.sides
+        path_min = self.fw.get_min_path(self.u, self.v)
+
+        # Keep only the part of the path between its last node in the first
+        # subtree and its first node in the second one, so it adds no cycle
+        j = [k for k, u in enumerate(path_min) if u in side_b][0]
+        i = [k for k, u in enumerate(path_min[:j]) if u in side_a][-1]
+        path_min = path_min[i:j+1]
+
+        removed = set([self.edge])
+        added = set(self.graph.get_edge(u, path_min[k+1])
+                for k, u in enumerate(path_min[:-1]))
+        stack = [self.edge.u, self.edge.v, path_min[0], path_min[-1]]
+        if isinstance(self.tree, Graph.ArrayTree):
+            Neighborhood._prune_array(self.graph, self.tree, removed, added,
+                    stack)
+        else:
+            Neighborhood._prune(self.tree, removed, added, stack)
+
+        self._removed = list(removed)
+        self._added = list(added)
+        self.delta = sum(e.weight for e in added) - \
+                sum(e.weight for e in removed)
+        self.tree = self.fw = self.sides = None
 
 class Neighborhood(object):
     random.seed()
@@ -180,8 +776,8 @@ class Neighborhood(object):
     @staticmethod
     def get(graph, tree, fw):
         """
-        Given a Graph, a SteinerTree and FloydWarshall, returns a neighborhood
-        for the graph.
+        Given a Graph, a SteinerTree and a ShortestPaths engine, returns a
+        neighborhood for the graph.
 
         What it does:
             * Remove an arbitrary edge 'e' of the tree T
@@ -189,81 +785,205 @@ class Neighborhood(object):
             * Remove unnecessary nodes and edges such all non terminal nodes
             * have degree at least two
         """
-
         t = tree.copy()
-        edge = random.choice(t.get_edges())
-        t.del_edge(edge)
-        # Add the nodes just in case some of them was deleted because it was
-        # isolated
-        t.add_node(edge.u)
-        t.add_node(edge.v)
-
-        # Find the minimum path that connects the two subtress
-        cost_min = t.get_cost()
-        path_min = None
-        for u in Neighborhood._get_subtree_from_root(t, edge.u):
-            for v in Neighborhood._get_subtree_from_root(t, edge.v):
-                if u == edge.u and v == edge.v:
-                    continue
-                path = fw.get_min_path(u, v)
-                cost = Helper.get_path_cost(graph, path)
-                if cost < cost_min:
-                    path_min = path
-                    cost_min = cost
-
-        # Add the path in the tree
-        for i, u in enumerate(path_min[:-1]):
-            e = graph.get_edge(u, path_min[i+1])
-            t.add_edge(e)
-
-        # Remove all unnecessary nodes and edges
-        st = Helper.make_tree_from_kruskal(t, t.terminals)
-        st.del_useless_edges()
+        move = Neighborhood.propose(graph, t, fw)
+        if move is not None:
+            move.apply(t)
+        return t
 
-        return st
+    @staticmethod
+    def propose(graph, tree, fw):
+        """
+        Give the Move leading to a neighbor of the tree, as described in get,
+        without changing the tree. Return None if the tree has no neighbor.
+        The tree is either a SteinerTree or an ArrayTree.
+
+        Only the cost of the move is computed: the Exchange given expands its
+        path when it is applied, so a rejected move costs no path walk.
+        """
+        if isinstance(tree, Graph.ArrayTree):
+            if not tree.edges:
+                return None
+            edge = graph._edge(random.choice(tree.edges))
+            nodes = graph.node_list
+            side_a, side_b = [set(map(nodes.__getitem__, side))
+                    for side in tree.split(edge)]
+        else:
+            edges = tree.get_edges()
+            if not edges:
+                return None
+            edge = random.choice(edges)
+            side_a = Neighborhood._get_component(tree, edge.u, edge.v)
+            side_b = Neighborhood._get_component(tree, edge.v, edge.u)
+
+        # Find the minimum path that connects the two subtress. Only the
+        # distances are compared
+        closest = fw.get_closest_pair(side_a, side_b, (edge.u, edge.v))
+        if closest is None:
+            return None
+        cost, u, v = closest
+        # With positive weights, the path can only go through another node
+        # of the subtrees by crossing the excluded pair. It is then trimmed
+        # to the path between the ends of the edge
+        a, b = edge.u, edge.v
+        bound = cost * (1 + 1e-12)
+        if (v is b and u is not a and
+                fw.get_dist(u, a) + fw.get_dist(a, b) <= bound) or \
+        (u is a and v is not b and
+                fw.get_dist(a, b) + fw.get_dist(b, v) <= bound):
+            cost, u, v = fw.get_dist(a, b), a, b
+        pruned = Neighborhood._get_pruned_cost(graph, tree, edge, u, v)
+        if pruned is None:
+            move = Exchange(graph, tree, fw, edge, (side_a, side_b), u, v, 0)
+            move.expand()
+            return move
+        return Exchange(graph, tree, fw, edge, (side_a, side_b), u, v,
+                cost - edge.weight - pruned)
+
+    @staticmethod
+    def _get_pruned_cost(graph, tree, edge, u, v):
+        """ Give the weight of the tree edges pruned once the edge is replaced
+        by a path from u to v. As the tree has no non terminal leaf, the
+        pruning only follows the chains left hanging at the ends of the edge,
+        and these stop before reaching u or v. None is given if one of them
+        does not, so that the path is needed """
+        array_tree = isinstance(tree, Graph.ArrayTree)
+        removed = set()
+        degree = {u: 1}
+        degree[v] = degree.get(v, 0) + 1
+        link = {}
+
+        def remove(e):
+            removed.add(e)
+            for x in (e.u, e.v):
+                degree[x] = degree.get(x, 0) - 1
+                if array_tree:
+                    link[x] = link.get(x, 0) ^ e.id
+
+        def leaf_edge(x):
+            if array_tree:
+                return graph._edge(tree.link[x.index] ^ link.get(x, 0))
+            for y in tree[x]:
+                e = tree.get_edge(x, y)
+                if e not in removed:
+                    return e
+
+        remove(edge)
+        cost = 0
+        stack = [edge.u, edge.v]
+        while stack:
+            x = stack.pop()
+            if tree.is_terminal(x) or tree.order(x) + degree[x] != 1:
+                continue
+            if x is u or x is v:
+                return None
+            e = leaf_edge(x)
+            remove(e)
+            cost += e.weight
+            stack.append(e.v if e.u is x else e.u)
+        return cost
 
     @staticmethod
-    def _get_subtree_from_root(tree, root):
-        dic = {}
-        Neighborhood._get(tree, root, dic)
-        return dic.keys()
+    def _prune(tree, removed, added, stack):
+        """ Prune the non terminal leaves left by the exchange of the removed
+        edges by the added ones, starting from the given nodes, the only ones
+        whose degree changed. Both sets are updated """
+        adjacent = {}
+        for e in added:
+            adjacent.setdefault(e.u, []).append((e.v, e))
+            adjacent.setdefault(e.v, []).append((e.u, e))
+
+        def neighbors(x):
+            nb = [(y, tree.get_edge(x, y)) for y in tree[x]]
+            nb = [(y, e) for y, e in nb if e not in removed]
+            return nb + [(y, e) for y, e in adjacent.get(x, ()) if e in added]
+
+        while stack:
+            x = stack.pop()
+            if tree.is_terminal(x):
+                continue
+            nb = neighbors(x)
+            if len(nb) == 1:
+                y, e = nb[0]
+                if e in added:
+                    added.remove(e)
+                else:
+                    removed.add(e)
+                stack.append(y)
 
     @staticmethod
-    def _get(tree, root, dic):
-        if root is None:
-            return
-        dic[root] = 1
-        for i in tree[root]:
-            if not i in dic or dic[i] != 1:
-                Neighborhood._get(tree, i, dic)
+    def _prune_array(graph, tree, removed, added, stack):
+        """ _prune for an ArrayTree: the leaves are found through its degree
+        and link arrays """
+        # Changes of the degree and link of the nodes touched by the move
+        degree = {}
+        link = {}
+
+        def change(e, d):
+            for i in (e.u.index, e.v.index):
+                degree[i] = degree.get(i, 0) + d
+                link[i] = link.get(i, 0) ^ e.id
+
+        for e in removed:
+            change(e, -1)
+        for e in added:
+            change(e, 1)
+
+        stack = [x.index for x in stack]
+        while stack:
+            i = stack.pop()
+            if tree.terminal[i] or tree.degree[i] + degree.get(i, 0) != 1:
+                continue
+            e = graph._edge(tree.link[i] ^ link.get(i, 0))
+            if e in added:
+                added.remove(e)
+            else:
+                removed.add(e)
+            change(e, -1)
+            stack.append(e.v.index if e.u.index == i else e.u.index)
+
+    @staticmethod
+    def _get_component(tree, root, cut):
+        """ Give the nodes reached from root without crossing the edge between
+        root and cut """
+        seen = set([root])
+        stack = [root]
+        while stack:
+            x = stack.pop()
+            for y in tree[x]:
+                if y not in seen and not (x == root and y == cut):
+                    seen.add(y)
+                    stack.append(y)
+        return seen
 
 class GraphGen(object):
     """ Generate a complete undirected graph """
-    _MAX_NODES = 1000
+    _MAX_NODES = 2000
     _MAX_WEIGHT = 10000
-    random.seed()
 
     @staticmethod
-    def generate(nodes_number=random.randint(5, _MAX_NODES), steiner=False):
+    def generate(nodes_number=None, steiner=False, seed=None, csr=False):
+        """ Give a complete graph of nodes_number nodes, a random number of
+        them up to _MAX_NODES if None. With 'steiner', give it with a random
+        list of terminals. The graph is built by generators.complete; it is
+        given as a Graph, or with 'csr' as the read-only CSRGraph the solvers
+        are fastest on """
+        import generators
+
+        rand = random.Random(seed)
+        if nodes_number is None:
+            nodes_number = rand.randint(5, GraphGen._MAX_NODES)
         if nodes_number > GraphGen._MAX_NODES:
             raise Graph.GraphError('Unsupported number of nodes %d' %nodes_number)
-            return None
+        terminals = 0
+        if steiner is True:
+            terminals = rand.randint(2, nodes_number - 1)
+        inst = generators.complete(nodes_number, terminals,
+                rand.randint(0, 2**31 - 1), GraphGen._MAX_WEIGHT)
+        graph, terminals = inst.get_graph()
+        if not csr:
+            graph = graph.copy()
+        if steiner is True:
+            return (graph, terminals)
         else:
-            graph = Graph.Graph()
-            terminals = []
-
-            # Create ndoes from 1 to nodes_number
-            for i in xrange(1, nodes_number + 1):
-                node = Graph.Node(i)
-                graph.add_node(node)
-
-                # Link with other nodes
-                for j in graph:
-                    if node != j:
-                        w = random.randint(1, GraphGen._MAX_WEIGHT)
-                        graph.add_edge(Graph.Edge(node, j, w))
-            if steiner is True:
-                return (graph, random.sample(graph.get_nodes(),
-                        random.randint(2, len(graph)-1)))
-            else:
-                return graph
+            return graph
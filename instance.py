@@ -0,0 +1,272 @@
+import os
+import re
+import sys
+import gzip
+import mmap
+import struct
+import ctypes
+from array import array
+from itertools import izip, imap, repeat
+from operator import sub
+import graph as Graph
+from graph_utils import ShortestPaths, FloydWarshall
+
+# Magic number opening the SteinLib files
+STP_MAGIC = '33d32945'
+
+_SECTION = re.compile(r'^\s*section\s+(\w+)(.*?)^\s*end\b',
+        re.I | re.M | re.S)
+_NODES = re.compile(r'^[ \t]*nodes[ \t]+(\d+)', re.I | re.M)
+_EDGES = re.compile(r'^[ \t]*edges[ \t]+(\d+)', re.I | re.M)
+_EDGE = re.compile(r'^[ \t]*[eE][ \t]+(\d+)[ \t]+(\d+)[ \t]+(\S+)', re.M)
+_TERMINAL = re.compile(r'^[ \t]*[tT][ \t]+(\d+)', re.M)
+
+# Binary format: a header (magic, version, flags, number of nodes, edges and
+# terminals, size and modification time of the source file) followed by the
+# arrays u, v, w, terminals and, if present, dist and pred, each one starting
+# on a multiple of 8 bytes and stored in the byte order of the writer
+BINARY_MAGIC = 'STPB'
+# Version 2: the predecessors are in last hop form
+BINARY_VERSION = 2
+BINARY_SUFFIX = '.stpb'
+_HEADER = struct.Struct('<4sIIIIIQd')
+_HAS_PATHS = 1
+_BIG_ENDIAN = 2
+
+class InstanceError(Exception):
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return self.value
+
+def open_file(filename):
+    """ Open the file, uncompressing it on the fly if it is gzipped """
+    f = open(filename, 'rb')
+    magic = f.read(2)
+    f.seek(0)
+    if magic == '\x1f\x8b':
+        f.close()
+        return gzip.open(filename, 'rb')
+    return f
+
+def is_instance(filename):
+    """ Tell whether the file looks like an instance: the 'Nodes' header of
+    the plain format or the SteinLib magic number """
+    try:
+        f = open_file(filename)
+        try:
+            line = f.readline().split()
+        finally:
+            f.close()
+    except IOError:
+        return False
+    return [w.lower() for w in line[:1]] in (['nodes'], [STP_MAGIC])
+
+class Instance(object):
+    """
+    A Steiner tree problem held as flat arrays: the nodes are numbered from 0
+    to n-1, the edge k joins u[k] and v[k] with weight w[k] and 'terminals'
+    holds the numbers of the terminal nodes.
+
+    The Graph objects are built only when get_graph is called. Their nodes
+    are labelled from 1 to n, as in the files.
+    """
+
+    def __init__(self, n, u, v, w, terminals, name=None):
+        self.n = n
+        self.u = u
+        self.v = v
+        self.w = w
+        self.terminals = terminals
+        self.name = name
+        self.nodes = None
+        self.graph = None
+        # Floyd-Warshall matrices, in the order of the node numbers
+        self.dist = None
+        self.pred = None
+        # Size and modification time of the file the instance was parsed from
+        self.source = (0, 0.0)
+        # Binary file where the instance is cached, if any
+        self.cache = None
+
+    def get_graph(self):
+        """ Give the (graph, terminals) pair, terminals being Node objects """
+        if self.graph is None:
+            self.nodes = [Graph.Node(i + 1) for i in xrange(self.n)]
+            self.graph = Graph.Graph.from_arrays(self.nodes, self.u, self.v,
+                    self.w)
+        return (self.graph, [self.nodes[t] for t in self.terminals])
+
+    def get_paths(self, shared=False):
+        """ Give the shortest path engine of the graph, whose node numbers are
+        the ones of the instance. Matrices loaded from the binary cache are
+        used as they are, and new Floyd-Warshall matrices are saved to it, so
+        that the next runs do not compute them again """
+        graph, terminals = self.get_graph()
+        if self.dist is not None:
+            return FloydWarshall(graph, self.dist, self.pred, self.nodes,
+                    ready=True)
+        paths = ShortestPaths.get(graph, shared, self.nodes)
+        if isinstance(paths, FloydWarshall):
+            self.dist = paths.dist
+            self.pred = paths.pred
+            if self.cache is not None:
+                try:
+                    write_binary(self, self.cache)
+                except (IOError, OSError):
+                    self.cache = None
+        return paths
+
+def parse(data, name=None):
+    """ Build an Instance from the text of a file, either in the plain format
+    (Nodes/Edges/E/Terminals/T lines) or in the SteinLib one, whose lines are
+    grouped in 'SECTION Graph' and 'SECTION Terminals' blocks """
+    graph = terminals = data
+    if data.lstrip()[:len(STP_MAGIC)].lower() == STP_MAGIC:
+        graph = terminals = ''
+        for section, body in _SECTION.findall(data):
+            if section.lower() == 'graph':
+                graph = body
+            elif section.lower() == 'terminals':
+                terminals = body
+
+    match = _NODES.search(graph)
+    if match is None:
+        raise InstanceError('%s: number of nodes not found' %name)
+    n = int(match.group(1))
+
+    edges = _EDGE.findall(graph)
+    match = _EDGES.search(graph)
+    if match is not None and int(match.group(1)) != len(edges):
+        raise InstanceError('%s: %s edges announced, %d found'
+                %(name, match.group(1), len(edges)))
+
+    if edges:
+        us, vs, ws = izip(*edges)
+    else:
+        us = vs = ws = ()
+    # The files count the nodes from 1
+    u = array('i', imap(sub, imap(int, us), repeat(1)))
+    v = array('i', imap(sub, imap(int, vs), repeat(1)))
+    w = array('d', imap(float, ws))
+    t = array('i', imap(sub, imap(int, _TERMINAL.findall(terminals)),
+        repeat(1)))
+
+    for a in (u, v, t):
+        if a and (min(a) < 0 or max(a) >= n):
+            raise InstanceError('%s: node out of range' %name)
+
+    return Instance(n, u, v, w, t, name)
+
+def read(filename):
+    """ Read an instance file, possibly gzipped """
+    f = open_file(filename)
+    try:
+        data = f.read()
+    finally:
+        f.close()
+    inst = parse(data, filename)
+    st = os.stat(filename)
+    inst.source = (st.st_size, st.st_mtime)
+    return inst
+
+def write_binary(inst, filename):
+    """ Write the instance, with its matrices if it has them, in the binary
+    format. The file is replaced atomically """
+    flags = 0
+    arrays = [inst.u, inst.v, inst.w, inst.terminals]
+    if inst.dist is not None:
+        flags |= _HAS_PATHS
+        arrays += [inst.dist, inst.pred]
+    if sys.byteorder == 'big':
+        flags |= _BIG_ENDIAN
+
+    tmp = '%s.%d.tmp' %(filename, os.getpid())
+    f = open(tmp, 'wb')
+    try:
+        f.write(_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, flags, inst.n,
+            len(inst.u), len(inst.terminals), inst.source[0],
+            inst.source[1]))
+        for a in arrays:
+            data = buffer(a)
+            f.write(data)
+            f.write('\0' * (-len(data) % 8))
+    finally:
+        f.close()
+    os.rename(tmp, filename)
+
+def read_binary(filename):
+    """ Map an instance written by write_binary. The arrays are views on the
+    mapped file: nothing is read until it is used, and the pages of the
+    matrices are shared by all the processes mapping the same file """
+    f = open(filename, 'rb')
+    try:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    finally:
+        f.close()
+    if len(mm) < _HEADER.size:
+        raise InstanceError('%s: truncated file' %filename)
+    magic, version, flags, n, m, t, size, mtime = \
+            _HEADER.unpack_from(mm, 0)
+    if magic != BINARY_MAGIC:
+        raise InstanceError('%s: not a binary instance' %filename)
+    if version != BINARY_VERSION:
+        raise InstanceError('%s: unsupported version %d' %(filename, version))
+    if bool(flags & _BIG_ENDIAN) != (sys.byteorder == 'big'):
+        raise InstanceError('%s: written with another byte order' %filename)
+
+    layout = [(ctypes.c_int32, m), (ctypes.c_int32, m), (ctypes.c_double, m),
+            (ctypes.c_int32, t)]
+    if flags & _HAS_PATHS:
+        layout += [(ctypes.c_double, n*n), (ctypes.c_int32, n*n)]
+    end = _HEADER.size
+    for ctype, count in layout:
+        end += ctypes.sizeof(ctype) * count
+        end += -end % 8
+    if len(mm) < end:
+        raise InstanceError('%s: truncated file' %filename)
+
+    arrays = []
+    offset = _HEADER.size
+    for ctype, count in layout:
+        arrays.append((ctype * count).from_buffer(mm, offset))
+        offset += ctypes.sizeof(ctype) * count
+        offset += -offset % 8
+
+    inst = Instance(n, arrays[0], arrays[1], arrays[2], arrays[3], filename)
+    if flags & _HAS_PATHS:
+        inst.dist = arrays[4]
+        inst.pred = arrays[5]
+    inst.source = (size, mtime)
+    return inst
+
+def load(filename, cache=True):
+    """
+    Read an instance through its binary cache, the file named as the
+    instance plus BINARY_SUFFIX. The cache is used if it was made from the
+    current version of the instance file, and written otherwise; it then also
+    keeps the shortest path matrices computed by get_paths.
+    """
+    if not cache:
+        return read(filename)
+
+    name = filename + BINARY_SUFFIX
+    st = os.stat(filename)
+    try:
+        inst = read_binary(name)
+        if inst.source == (st.st_size, st.st_mtime):
+            inst.name = filename
+            inst.cache = name
+            return inst
+    except (IOError, OSError, InstanceError):
+        pass
+
+    inst = read(filename)
+    try:
+        write_binary(inst, name)
+        inst.cache = name
+    except (IOError, OSError):
+        pass
+    return inst
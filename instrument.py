@@ -0,0 +1,53 @@
+import sys
+from collections import deque
+
+# Events sent by SimulatedAnnealing to its observers, with their data:
+#   'phase'    name, seconds: a phase ended ('paths', 'heuristic',
+#              'annealing', 'local_search')
+#   'initial'  cost: the initial solution is known
+#   'improved' cost, evaluations: a new best solution was found
+#   'sample'   evaluations, temperature, cost, best: every 'sample' proposals
+#   'stopped'  reason ('budget', 'cancelled', 'little difference' or
+#              'overflow'), evaluations: the annealing ended
+EVENTS = ('phase', 'initial', 'improved', 'sample', 'stopped')
+
+class Printer(object):
+    """ Observer writing the progress of the annealing as stein.py always did
+    """
+
+    def __init__(self, out=None):
+        self.out = out or sys.stdout
+
+    def __call__(self, event, data):
+        if event == 'initial':
+            print >>self.out, 'Initial solution: %d' %data['cost']
+        elif event == 'improved':
+            print >>self.out, 'New optimal solution: %d' %data['cost']
+        elif event == 'stopped' and data['reason'] == 'little difference':
+            print >>self.out, 'Stopping because little difference'
+
+class Trace(object):
+    """
+    Observer keeping the last 'size' samples of the annealing as
+    (evaluations, temperature, cost, best) tuples, the older ones being
+    dropped, so a long run uses a fixed amount of memory.
+    """
+
+    def __init__(self, size=1000):
+        self.samples = deque(maxlen=size)
+
+    def __call__(self, event, data):
+        if event == 'sample':
+            self.samples.append((data['evaluations'], data['temperature'],
+                data['cost'], data['best']))
+
+class Log(object):
+    """ Observer keeping every event but the samples, as (event, data) pairs
+    """
+
+    def __init__(self):
+        self.events = []
+
+    def __call__(self, event, data):
+        if event != 'sample':
+            self.events.append((event, data))
@@ -0,0 +1,265 @@
+from array import array
+from collections import deque
+import heapq
+from graph_utils import ShortestPaths, Helper, MST
+
+class LocalSearch(object):
+    """
+    Deterministic improvement of a SteinerTree. The key vertices of a tree
+    are its terminals and its nodes of degree 3 or more; the key paths join
+    them through Steiner nodes of degree 2. At each iteration every move of
+    the three kinds below is valued from the shortest path distances, and the
+    best one is done:
+
+        * key path exchange: a key path is replaced by the shortest path
+          between the two components it joined
+        * key vertex elimination: a Steiner key vertex and its key paths are
+          removed, and the components left are joined again by the minimum
+          spanning tree of the distances between them
+        * vertex insertion: a node out of the tree is added with its edges to
+          the tree nodes, and the minimum spanning tree of the result is kept
+
+    The best move may make the tree worse, so the search can leave a local
+    minimum. The vertices touched by the last 'tenure' moves are tabu: a move
+    touching them is only done if it gives a new best tree. The search stops
+    after 'patience' iterations without a new best tree, or 'iterations' in
+    all.
+    """
+
+    def __init__(self, graph, terminals, paths=None, tenure=7, patience=10,
+            iterations=100, insertions=20, period=None):
+        """
+        'insertions' is the number of nodes, the closest to the tree, tried by
+        the vertex insertion at each iteration. 'period' is the number of
+        annealing evaluations between two runs of the search, for
+        SimulatedAnnealing; None runs it only on the final tree.
+        """
+        self.graph = graph
+        self.terminals = terminals
+        self.paths = paths
+        self.tenure = tenure
+        self.patience = patience
+        self.iterations = iterations
+        self.insertions = insertions
+        self.period = period
+        # Number of moves valued by the last run
+        self.evaluations = 0
+
+    def improve(self, tree):
+        """ Give the best tree found from the given one, which is not changed
+        """
+        if self.paths is None:
+            self.paths = ShortestPaths.get(self.graph)
+        current = tree.copy()
+        best = tree.copy()
+        # The vertices touched by each of the last 'tenure' moves
+        tabu = deque(maxlen=self.tenure)
+        self.evaluations = 0
+        stale = 0
+        for i in xrange(self.iterations):
+            moves = self.get_moves(current)
+            self.evaluations += len(moves)
+            moves.sort(key=lambda m: m[0])
+            for delta, touched, kind, data in moves:
+                aspiration = current.get_cost() + delta < best.get_cost()
+                if aspiration or not any(x in m for m in tabu
+                        for x in touched):
+                    break
+            else:
+                break
+
+            current = getattr(self, '_apply_' + kind)(current, data)
+            tabu.append(touched)
+            if current.get_cost() < best.get_cost():
+                best = current.copy()
+                stale = 0
+            else:
+                stale += 1
+                if stale >= self.patience:
+                    break
+        return best
+
+    def get_moves(self, tree):
+        """ Give the moves of the tree as (delta, touched vertices, kind,
+        data) tuples. The delta of the eliminations and insertions is an upper
+        bound: paths may overlap and leaves be pruned once they are done """
+        key_paths = self.get_key_paths(tree)
+        preorder = self._get_preorder(tree)
+        return self._exchanges(tree, key_paths, preorder) + \
+                self._eliminations(tree, key_paths, preorder) + \
+                self._insertions(tree)
+
+    def get_key_paths(self, tree):
+        """ Give the key paths of the tree as (start, end, edges, cost, nodes)
+        tuples, nodes going from start to end """
+        def is_key(x):
+            return tree.is_terminal(x) or tree.order(x) != 2
+
+        found = []
+        seen = set()
+        for x in tree:
+            if not is_key(x):
+                continue
+            for y in tree[x]:
+                e = tree.get_edge(x, y)
+                if e in seen:
+                    continue
+                edges = [e]
+                nodes = [x, y]
+                while not is_key(nodes[-1]):
+                    for z in tree[nodes[-1]]:
+                        if z is not nodes[-2]:
+                            break
+                    f = tree.get_edge(nodes[-1], z)
+                    edges.append(f)
+                    nodes.append(z)
+                seen.update(edges)
+                found.append((x, nodes[-1], edges,
+                    sum(f.weight for f in edges), nodes))
+        return found
+
+    def _get_preorder(self, tree):
+        """ Give the tree nodes in depth first order from a terminal, and the
+        position of each node and of the end of its subtree in that list. As
+        the root is a key vertex, each key path goes down from one end to the
+        other """
+        root = None
+        for t in self.terminals:
+            if t in tree:
+                root = t
+                break
+        order = []
+        first = {}
+        last = {}
+        if root is None:
+            return order, first, last
+        stack = [(root, None, False)]
+        while stack:
+            x, parent, done = stack.pop()
+            if done:
+                last[x] = len(order)
+                continue
+            first[x] = len(order)
+            order.append(x)
+            stack.append((x, parent, True))
+            for y in tree[x]:
+                if y is not parent:
+                    stack.append((y, x, False))
+        return order, first, last
+
+    def _get_sides(self, preorder, nodes):
+        """ Give the nodes of the components left at the start and at the end
+        of the key path of the given nodes once it is removed """
+        order, first, last = preorder
+        start, end = nodes[0], nodes[-1]
+        if first[start] <= first[end] < last[start]:
+            low, top = end, nodes[1]
+        else:
+            low, top = start, nodes[-2]
+        below = set(order[first[low]:last[low]])
+        above = set(order[:first[top]])
+        above.update(order[last[top]:])
+        if low is end:
+            return above, below
+        return below, above
+
+    def _exchanges(self, tree, key_paths, preorder):
+        moves = []
+        for start, end, edges, cost, nodes in key_paths:
+            side_a, side_b = self._get_sides(preorder, nodes)
+            closest = self.paths.get_closest_pair(side_a, side_b)
+            if closest is None or closest[0] >= cost:
+                continue
+            moves.append((closest[0] - cost, (start, end), 'exchange',
+                (edges, closest[1], closest[2])))
+        return moves
+
+    def _apply_exchange(self, tree, data):
+        edges, u, v = data
+        tree = tree.copy()
+        for e in edges:
+            tree.del_edge(e)
+        self._add_path(tree, u, v)
+        for t in self.terminals:
+            tree.add_terminal(t)
+        tree.del_useless_edges()
+        return tree
+
+    def _add_path(self, tree, u, v):
+        for e in self.paths.get_path_edges(u, v):
+            tree.add_edge(e)
+
+    def _eliminations(self, tree, key_paths, preorder):
+        incident = {}
+        for start, end, edges, cost, nodes in key_paths:
+            side_a, side_b = self._get_sides(preorder, nodes)
+            incident.setdefault(start, []).append((side_b, edges, cost))
+            incident.setdefault(end, []).append((side_a, edges, cost))
+
+        moves = []
+        for x, around in incident.iteritems():
+            if tree.is_terminal(x) or len(around) < 3:
+                continue
+            cut = set(e for side, edges, cost in around for e in edges)
+            sides = [side for side, edges, cost in around]
+            pairs = {}
+            for i in xrange(len(sides)):
+                for j in xrange(i):
+                    pairs[(i, j)] = pairs[(j, i)] = \
+                            self.paths.get_closest_pair(sides[i], sides[j])
+            if None in pairs.values():
+                continue
+            parent = MST.prim(len(sides), lambda i: [0 if i == j else
+                pairs[(i, j)][0] for j in xrange(len(sides))])
+            joins = [pairs[(i, p)] for i, p in enumerate(parent) if p >= 0]
+            delta = sum(c for c, u, v in joins) - \
+                    sum(cost for side, edges, cost in around)
+            moves.append((delta, (x,), 'elimination', (cut, joins)))
+        return moves
+
+    def _apply_elimination(self, tree, data):
+        cut, joins = data
+        edges = [e for e in tree.get_edges() if e not in cut]
+        for c, u, v in joins:
+            edges.extend(self.paths.get_path_edges(u, v))
+        return Helper.make_tree_from_paths(list(set(edges)), self.terminals)
+
+    def _insertions(self, tree):
+        """ Value the insertion of the nodes out of the tree adjacent to two
+        of its nodes or more, the ones whose two lightest edges to the tree
+        are the lightest first """
+        nodes = tree.get_nodes()
+        candidates = {}
+        for y in nodes:
+            for x in self.graph[y]:
+                if x not in tree:
+                    candidates.setdefault(x, []).append(
+                            self.graph.get_edge(x, y))
+        scored = [(sum(heapq.nsmallest(2, [e.weight for e in edges])), x)
+                for x, edges in candidates.iteritems() if len(edges) > 1]
+        best = heapq.nsmallest(self.insertions, scored,
+                key=lambda s: s[0])
+
+        tree_edges = tree.get_edges()
+        index = dict((x, i) for i, x in enumerate(nodes))
+        us = array('i', [index[e.u] for e in tree_edges])
+        vs = array('i', [index[e.v] for e in tree_edges])
+        ws = array('d', [e.weight for e in tree_edges])
+        n = len(nodes)
+        moves = []
+        for score, x in best:
+            edges = candidates[x]
+            near = array('i', [index[e.v if e.u is x else e.u] for e in edges])
+            chosen = MST.kruskal(n + 1, us + near,
+                    vs + array('i', [n]) * len(edges),
+                    ws + array('d', [e.weight for e in edges]))
+            cost = sum((ws[k] if k < len(ws) else edges[k - len(ws)].weight)
+                    for k in chosen)
+            if cost < tree.get_cost():
+                moves.append((cost - tree.get_cost(), (x,), 'insertion',
+                    edges))
+        return moves
+
+    def _apply_insertion(self, tree, edges):
+        return Helper.make_tree_from_paths(tree.get_edges() + edges,
+                self.terminals)
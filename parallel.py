@@ -0,0 +1,241 @@
+import multiprocessing
+import random
+import math
+import graph as Graph
+from graph_utils import ShortestPaths
+from graph_utils import HAlgorithm as HA
+from simulannealing import SimulatedAnnealing as SimulAnn
+
+# State of a worker process, set once by _init_worker. The shortest path
+# engine is inherited through fork: a Floyd-Warshall one lives in shared
+# memory, so it is neither pickled nor copied
+_worker = {}
+
+def _init_worker(graph, terminals, paths, percent, stop, heuristic=HA,
+        local_search=None):
+    _worker['graph'] = graph
+    _worker['terminals'] = terminals
+    _worker['paths'] = paths
+    _worker['percent'] = percent
+    _worker['stop'] = stop
+    _worker['heuristic'] = heuristic
+    _worker['local_search'] = local_search
+
+def _run_chain(options):
+    """ Run one annealing chain and give its cost and its edges as pairs of
+    node numbers of the shortest path engine """
+    paths = _worker['paths']
+    sa = SimulAnn(_worker['graph'], _worker['terminals'], _worker['percent'],
+            _worker['stop'], paths, _worker['heuristic'],
+            _worker['local_search'])
+    tree = sa.get_min_steiner_tree(**options)
+    k = paths.index
+    return (tree.get_cost(), [(k[e.u], k[e.v]) for e in tree.get_edges()])
+
+def _run_replica(args):
+    """ Run one replica at its temperature from the given state and give the
+    cost and edges of its last and of its best tree """
+    edges, t, steps, seed = args
+    random.seed(seed)
+    graph, terminals, paths = \
+            _worker['graph'], _worker['terminals'], _worker['paths']
+    tree = make_tree(graph, terminals, paths, edges)
+    sa = SimulAnn(graph, terminals, paths=paths)
+    best = sa.run_at_temperature(tree, t, steps, paths)
+    k = paths.index
+    return (tree.get_cost(), [(k[e.u], k[e.v]) for e in tree.get_edges()],
+            best.get_cost(), [(k[e.u], k[e.v]) for e in best.get_edges()])
+
+def make_tree(graph, terminals, paths, edges):
+    """ Build the SteinerTree of the graph given by pairs of node numbers """
+    nodes = paths.nodes
+    st = Graph.SteinerTree()
+    for u, v in edges:
+        st.add_edge(graph.get_edge(nodes[u], nodes[v]))
+    for t in terminals:
+        st.add_terminal(t)
+    return st
+
+class MultiStart(object):
+    """
+    Run several independent SimulatedAnnealing chains over a pool of
+    processes and keep the best tree found.
+
+    The shortest paths are computed once, before the workers are started, and
+    shared with all of them.
+    """
+
+    def __init__(self, graph, terminals, jobs=None, percent=0.01, stop=40,
+            paths=None, heuristic=HA, local_search=None):
+        """
+        jobs is the number of worker processes, all the cores if None.
+        percent, stop, heuristic and local_search are given to each
+        SimulatedAnnealing. paths is a ShortestPaths engine already built for
+        the graph, if any.
+        """
+        self.graph = graph
+        self.paths = paths
+        self.terminals = terminals
+        self.jobs = jobs or multiprocessing.cpu_count()
+        self.percent = percent
+        self.stop = stop
+        self.heuristic = heuristic
+        self.local_search = local_search
+        self.optimal = None
+
+    def get_min_steiner_tree(self, chains=None, **options):
+        """
+        Get the minimum steiner tree over several chains.
+
+        chains is either the number of chains to run, one per job if None, or
+        a list of dicts, one per chain, overriding the options for that chain
+        (e.g. its 'seed', 't_0' or 'alfa'). The remaining options are the ones
+        of SimulatedAnnealing.get_min_steiner_tree. Chains without a seed get
+        a distinct random one.
+        """
+        if chains is None:
+            chains = self.jobs
+        if isinstance(chains, int):
+            chains = [{} for i in xrange(chains)]
+
+        seeds = random.SystemRandom()
+        runs = []
+        for chain in chains:
+            run = dict(options)
+            run.update(chain)
+            if run.get('seed') is None:
+                run['seed'] = seeds.randint(0, 2**31 - 1)
+            runs.append(run)
+
+        paths = self.paths
+        if paths is None:
+            paths = ShortestPaths.get(self.graph, shared=self.jobs > 1)
+        args = (self.graph, self.terminals, paths, self.percent, self.stop,
+                self.heuristic, self.local_search)
+        if self.jobs > 1 and len(runs) > 1:
+            pool = multiprocessing.Pool(min(self.jobs, len(runs)),
+                    _init_worker, args)
+            try:
+                results = pool.map(_run_chain, runs)
+            finally:
+                pool.terminate()
+                pool.join()
+        else:
+            _init_worker(*args)
+            results = map(_run_chain, runs)
+
+        cost, edges = min(results, key=lambda r: r[0])
+        self.optimal = make_tree(self.graph, self.terminals, paths, edges)
+        return self.optimal
+
+class ParallelTempering(object):
+    """
+    Replica exchange: several Metropolis chains run at a fixed ladder of
+    temperatures, one per worker process. After each round of 'steps' moves,
+    the states of neighbouring temperatures are swapped with probability
+    min(1, exp((E_i - E_j) * (1/T_i - 1/T_j))), so good states found by the
+    hot chains sink to the cold ones instead of freezing in one valley.
+    """
+
+    def __init__(self, graph, terminals, replicas=8, jobs=None, paths=None,
+            heuristic=HA, local_search=None):
+        """
+        replicas is the number of temperatures in the ladder and jobs the
+        number of worker processes, all the cores if None. paths is a
+        ShortestPaths engine already built for the graph, if any, and
+        heuristic the class giving the initial solution. local_search, a
+        localsearch.LocalSearch, improves the best tree at the end.
+        """
+        self.graph = graph
+        self.paths = paths
+        self.terminals = terminals
+        self.replicas = max(2, replicas)
+        self.jobs = jobs or multiprocessing.cpu_count()
+        self.heuristic = heuristic
+        self.local_search = local_search
+        self.optimal = None
+        self.swaps = (0, 0)
+
+    def get_temperatures(self, cost, t_min, t_max):
+        """ Give the geometric ladder between t_min and t_max, fractions of
+        the given cost """
+        r = (float(t_max)/t_min)**(1.0/(self.replicas - 1))
+        return [cost * t_min * r**i for i in xrange(self.replicas)]
+
+    def get_min_steiner_tree(self, t_min=0.001, t_max=0.1, rounds=50,
+            steps=100, seed=None, budget=None):
+        """
+        Get the minimum steiner tree.
+        Options:
+            t_min, t_max: the coldest and hottest temperatures, as fractions
+                          of the cost of the initial solution
+            rounds: how many exchanges to do
+            steps: how many iterations each replica does between exchanges
+            seed: the seed of the exchanges and of the replicas' seeds
+            budget: a schedules.Budget; no round is started once it is
+                    exhausted, each round spending steps evaluations per
+                    replica. With a budget, rounds may be None for no bound
+        """
+        if budget is not None:
+            budget.start()
+        rand = random.Random(seed)
+        paths = self.paths
+        if paths is None:
+            paths = ShortestPaths.get(self.graph, shared=self.jobs > 1)
+        initial = self.heuristic(self.graph, self.terminals,
+                paths).get_steiner_tree()
+        self.optimal = initial
+        k = paths.index
+        edges = [(k[e.u], k[e.v]) for e in initial.get_edges()]
+        temps = self.get_temperatures(initial.get_cost(), t_min, t_max)
+        # Replica i is at the temperature temps[i]
+        states = [(initial.get_cost(), edges) for t in temps]
+        best = (initial.get_cost(), edges)
+        accepted = tried = 0
+
+        args = (self.graph, self.terminals, paths, 0, 0)
+        pool = None
+        if self.jobs > 1:
+            pool = multiprocessing.Pool(min(self.jobs, self.replicas),
+                    _init_worker, args)
+            run = pool.map
+        else:
+            _init_worker(*args)
+            run = map
+        try:
+            i = 0
+            while rounds is None or i < rounds:
+                if budget is not None:
+                    if budget.exhausted():
+                        break
+                    budget.spend(steps * self.replicas)
+                results = run(_run_replica, [(e, t, steps,
+                    rand.randint(0, 2**31 - 1))
+                    for (c, e), t in zip(states, temps)])
+                states = [(r[0], r[1]) for r in results]
+                for r in results:
+                    if r[2] < best[0]:
+                        best = (r[2], r[3])
+
+                # Exchange the neighbours (0, 1), (2, 3)... on even rounds and
+                # (1, 2), (3, 4)... on odd ones
+                for j in xrange(i % 2, self.replicas - 1, 2):
+                    tried += 1
+                    a = (states[j][0] - states[j+1][0]) * \
+                            (1.0/temps[j] - 1.0/temps[j+1])
+                    if a >= 0 or rand.random() < math.exp(a):
+                        states[j], states[j+1] = states[j+1], states[j]
+                        accepted += 1
+                i += 1
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+        self.swaps = (accepted, tried)
+        self.optimal = make_tree(self.graph, self.terminals, paths, best[1])
+        if self.local_search is not None:
+            if self.local_search.paths is None:
+                self.local_search.paths = paths
+            self.optimal = self.local_search.improve(self.optimal)
+        return self.optimal
@@ -0,0 +1,245 @@
+import heapq
+from array import array
+from itertools import izip
+import graph as Graph
+import instance
+from graph_utils import ShortestPaths
+
+class Reduction(object):
+    """
+    Shrink an Instance with the classic tests that keep at least one optimal
+    solution, repeated until none of them applies:
+
+        * 'leaves': a non terminal node of degree 1 is removed with its edge
+        * 'chains': a non terminal node of degree 2 is replaced by one edge
+          joining its two neighbors, weighting the sum of both
+        * 'terminals': the lightest edge of a terminal is contracted when it
+          leads to another terminal or when it is its only edge
+        * 'long_edges': an edge is removed when another path between its ends
+          is not longer
+
+    Each edge of the reduced instance stands for a list of edges of the
+    original one, and the contracted edges belong to every solution, so a
+    tree of the reduced instance is expanded back by expand.
+    """
+
+    # The long edge test of sparse graphs gives up after settling this many
+    # nodes, keeping the edge
+    LONG_EDGE_LIMIT = 100
+
+    def __init__(self, inst):
+        self.inst = inst
+        self.stats = dict.fromkeys(['leaves', 'chains', 'terminals',
+            'long_edges'], 0)
+        # Original edge numbers of the contracted edges
+        self.fixed = []
+        # Original node number of each node, and original edge numbers of each
+        # edge, of the reduced instance
+        self.nodes = None
+        self.edges = None
+        self.reduced = None
+
+    def reduce(self, long_edges=True):
+        """ Give the reduced Instance """
+        inst = self.inst
+        n = inst.n
+        self.adj = [{} for i in xrange(n)]
+        self.weight = []
+        self.orig = []
+        self.alive = bytearray('\x01' * n)
+        self.terminal = bytearray(n)
+        for t in inst.terminals:
+            self.terminal[t] = 1
+        self.terminal_count = self.terminal.count('\x01')
+        for k, a, b, c in izip(xrange(len(inst.u)), inst.u, inst.v, inst.w):
+            if a != b:
+                self._join(a, b, c, (k,))
+
+        if self.terminal_count <= 1:
+            # Nothing needs to be connected
+            for i in xrange(n):
+                self.adj[i] = {}
+                if not self.terminal[i]:
+                    self.alive[i] = 0
+        else:
+            self._degree_tests(xrange(n))
+            while long_edges and self.terminal_count > 1:
+                removed = self._long_edges()
+                if not removed:
+                    break
+                self._degree_tests(removed)
+
+        self.reduced = self._build()
+        del self.adj, self.weight, self.orig
+        return self.reduced
+
+    def expand(self, tree):
+        """ Give the SteinerTree of the original instance made of the edges
+        the given tree of the reduced instance stands for, and of the
+        contracted ones """
+        graph, terminals = self.inst.get_graph()
+        nodes, u, v = self.inst.nodes, self.inst.u, self.inst.v
+        st = Graph.SteinerTree()
+        for e in tree.get_edges():
+            k = self.index[(e.u.label - 1, e.v.label - 1)]
+            for j in self.edges[k]:
+                st.add_edge(graph.get_edge(nodes[u[j]], nodes[v[j]]))
+        for j in self.fixed:
+            st.add_edge(graph.get_edge(nodes[u[j]], nodes[v[j]]))
+        for t in terminals:
+            st.add_terminal(t)
+        st.del_useless_edges()
+        return st
+
+    def _join(self, a, b, c, orig):
+        """ Add an edge between a and b, or make the one there lighter """
+        e = self.adj[a].get(b)
+        if e is None:
+            e = len(self.weight)
+            self.weight.append(c)
+            self.orig.append(orig)
+            self.adj[a][b] = e
+            self.adj[b][a] = e
+        elif c < self.weight[e]:
+            self.weight[e] = c
+            self.orig[e] = orig
+
+    def _cut(self, a, b):
+        del self.adj[a][b]
+        del self.adj[b][a]
+
+    def _degree_tests(self, nodes):
+        """ Apply the leaves, chains and terminals tests from the given nodes,
+        going on with the neighbors of the changed ones """
+        adj, weight, orig, terminal = \
+                self.adj, self.weight, self.orig, self.terminal
+        stack = list(nodes)
+        while stack and self.terminal_count > 1:
+            x = stack.pop()
+            if not self.alive[x]:
+                continue
+            d = len(adj[x])
+            if not terminal[x]:
+                if d == 0:
+                    self.alive[x] = 0
+                elif d == 1:
+                    y = adj[x].keys()[0]
+                    self._cut(x, y)
+                    self.alive[x] = 0
+                    self.stats['leaves'] += 1
+                    stack.append(y)
+                elif d == 2:
+                    (a, e), (b, f) = adj[x].items()
+                    self._cut(x, a)
+                    self._cut(x, b)
+                    self.alive[x] = 0
+                    self._join(a, b, weight[e] + weight[f], orig[e] + orig[f])
+                    self.stats['chains'] += 1
+                    stack.extend((a, b))
+            elif d > 0:
+                y = min(adj[x], key=lambda y: weight[adj[x][y]])
+                if d == 1 or terminal[y]:
+                    # y is merged into x
+                    self.fixed.extend(orig[adj[x][y]])
+                    self._cut(x, y)
+                    for z, e in adj[y].items():
+                        self._cut(y, z)
+                        self._join(x, z, weight[e], orig[e])
+                    self.alive[y] = 0
+                    if terminal[y]:
+                        self.terminal_count -= 1
+                    self.stats['terminals'] += 1
+                    stack.append(x)
+                    stack.extend(adj[x])
+
+    def _long_edges(self):
+        """ Remove the edges for which there is another path not longer, and
+        give the ends of the removed ones """
+        alive = [i for i in xrange(self.inst.n) if self.alive[i]]
+        n = len(alive)
+        m = sum(len(self.adj[i]) for i in alive) / 2
+        if n <= ShortestPaths.MAX_DENSE_NODES and \
+        m >= ShortestPaths.SPARSE_DENSITY * n * (n - 1) / 2:
+            removed = self._long_edges_dense(alive)
+        else:
+            removed = self._long_edges_sparse(alive)
+        self.stats['long_edges'] += len(removed) / 2
+        return removed
+
+    def _long_edges_dense(self, alive):
+        """ Remove the edges longer than the distance between their ends. A
+        path strictly shorter remains made of kept edges, so all of them are
+        removed at once """
+        import floydwarshall as fw
+
+        n = len(alive)
+        index = dict((x, i) for i, x in enumerate(alive))
+        m_adj = array('d', [0.0]) * (n*n)
+        for a in alive:
+            for b, e in self.adj[a].iteritems():
+                m_adj[index[a]*n + index[b]] = self.weight[e]
+        dist = array('d', [0.0]) * (n*n)
+        pred = array('i', [0]) * (n*n)
+        fw.floydwarshall_buffer(n, m_adj, dist, pred)
+
+        removed = []
+        for a in alive:
+            for b, e in self.adj[a].items():
+                if a < b and dist[index[a]*n + index[b]] < self.weight[e]:
+                    self._cut(a, b)
+                    removed.extend((a, b))
+        return removed
+
+    def _long_edges_sparse(self, alive):
+        """ Remove, one at a time, the edges whose ends are joined by another
+        path not longer, looked for by a Dijkstra bounded by their weight """
+        adj, weight = self.adj, self.weight
+        edges = [(weight[e], a, b) for a in alive
+                for b, e in adj[a].iteritems() if a < b]
+        edges.sort(reverse=True)
+        removed = []
+        for c, a, b in edges:
+            e = adj[a][b]
+            dist = {a: 0.0}
+            heap = [(0.0, a)]
+            settled = 0
+            found = False
+            while heap and settled < Reduction.LONG_EDGE_LIMIT:
+                d, x = heapq.heappop(heap)
+                if d > dist[x]:
+                    continue
+                if x == b:
+                    found = True
+                    break
+                settled += 1
+                for y, f in adj[x].iteritems():
+                    nd = d + weight[f]
+                    if f != e and nd <= c and nd < dist.get(y, nd + 1):
+                        dist[y] = nd
+                        heapq.heappush(heap, (nd, y))
+            if found:
+                self._cut(a, b)
+                removed.extend((a, b))
+        return removed
+
+    def _build(self):
+        """ Give the Instance of the alive nodes and their edges """
+        alive = [i for i in xrange(self.inst.n) if self.alive[i]]
+        number = dict((x, i) for i, x in enumerate(alive))
+        us, vs, ws = array('i'), array('i'), array('d')
+        self.nodes = array('i', alive)
+        self.edges = []
+        self.index = {}
+        for a in alive:
+            for b, e in self.adj[a].iteritems():
+                if a < b:
+                    k = len(self.edges)
+                    us.append(number[a])
+                    vs.append(number[b])
+                    ws.append(self.weight[e])
+                    self.edges.append(self.orig[e])
+                    self.index[(number[a], number[b])] = k
+                    self.index[(number[b], number[a])] = k
+        terminals = array('i', [number[t] for t in alive if self.terminal[t]])
+        return instance.Instance(len(alive), us, vs, ws, terminals,
+                self.inst.name)
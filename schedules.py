@@ -0,0 +1,156 @@
+import math
+import time
+
+class Schedule(object):
+    """
+    Base class of the cooling schedules. The annealer reads 'temperature'
+    before each proposal and calls update once the proposal is decided.
+
+    The temperatures are relative: SimulatedAnnealing scales them by a
+    factor calibrated on the first cost differences it sees.
+    """
+
+    def __init__(self, t_0=1):
+        self.t_0 = t_0
+        self.temperature = t_0
+
+    def reset(self):
+        """ Go back to the initial temperature, before a new run """
+        self.temperature = self.t_0
+
+    def update(self, accepted, improved):
+        """ Take into account a proposal: whether it was accepted and whether
+        it gave a new best solution """
+        pass
+
+class Geometric(Schedule):
+    """ Multiply the temperature by alfa every 'steps' proposals """
+
+    def __init__(self, t_0=1, alfa=0.95, steps=200):
+        Schedule.__init__(self, t_0)
+        self.alfa = alfa
+        self.steps = steps
+        self.count = 0
+
+    def reset(self):
+        Schedule.reset(self)
+        self.count = 0
+
+    def update(self, accepted, improved):
+        self.count += 1
+        if self.count >= self.steps:
+            self.count = 0
+            self.temperature *= self.alfa
+
+class LundyMees(Schedule):
+    """ Lundy and Mees' schedule: t = t / (1 + beta * t) every 'steps'
+    proposals, which cools slowly at low temperatures """
+
+    def __init__(self, t_0=1, beta=0.001, steps=1):
+        Schedule.__init__(self, t_0)
+        self.beta = beta
+        self.steps = steps
+        self.count = 0
+
+    def reset(self):
+        Schedule.reset(self)
+        self.count = 0
+
+    def update(self, accepted, improved):
+        self.count += 1
+        if self.count >= self.steps:
+            self.count = 0
+            t = self.temperature
+            self.temperature = t / (1 + self.beta * t)
+
+class Adaptive(Schedule):
+    """
+    Cool by alfa after each window of 'steps' proposals whose acceptance rate
+    is above 'target', and by the square root of alfa otherwise, so the
+    temperature goes down quickly while most moves pass and slowly once the
+    chain is choosy.
+
+    After 'patience' windows without a new best solution the temperature is
+    raised back to 'reheat' times the initial one, to leave the valley the
+    chain is frozen in. 'reheats' counts how many times that happened.
+    """
+
+    def __init__(self, t_0=1, alfa=0.95, steps=100, target=0.2, patience=20,
+            reheat=0.5):
+        Schedule.__init__(self, t_0)
+        self.alfa = alfa
+        self.steps = steps
+        self.target = target
+        self.patience = patience
+        self.reheat = reheat
+        self.reset()
+
+    def reset(self):
+        Schedule.reset(self)
+        self.count = 0
+        self.accepted = 0
+        self.stagnant = 0
+        self.improved = False
+        self.reheats = 0
+
+    def update(self, accepted, improved):
+        self.count += 1
+        self.accepted += accepted
+        self.improved = self.improved or improved
+        if self.count < self.steps:
+            return
+
+        if float(self.accepted) / self.count > self.target:
+            self.temperature *= self.alfa
+        else:
+            self.temperature *= math.sqrt(self.alfa)
+
+        if self.improved:
+            self.stagnant = 0
+        else:
+            self.stagnant += 1
+            if self.stagnant >= self.patience:
+                self.temperature = max(self.temperature,
+                        self.reheat * self.t_0)
+                self.stagnant = 0
+                self.reheats += 1
+        self.count = self.accepted = 0
+        self.improved = False
+
+class Budget(object):
+    """
+    Bound a run by wall clock seconds, by a number of evaluations (proposals)
+    or both; None means no bound. The clock starts with start.
+
+    cancel ends the run at its next evaluation. It may be called from another
+    thread, and start does not undo it.
+    """
+
+    def __init__(self, seconds=None, evaluations=None):
+        self.seconds = seconds
+        self.evaluations = evaluations
+        self.used = 0
+        self.deadline = None
+        self.cancelled = False
+
+    def start(self):
+        self.used = 0
+        if self.seconds is not None:
+            self.deadline = time.time() + self.seconds
+
+    def spend(self, evaluations=1):
+        self.used += evaluations
+
+    def cancel(self):
+        self.cancelled = True
+
+    def exhausted(self):
+        if self.cancelled:
+            return True
+        if self.evaluations is not None and self.used >= self.evaluations:
+            return True
+        return self.deadline is not None and time.time() >= self.deadline
+
+# Schedules by name, for the command line
+SCHEDULES = {'geometric': Geometric, 'lundy-mees': LundyMees,
+        'adaptive': Adaptive}
@@ -0,0 +1,378 @@
+#!/usr/bin/env python
+
+"""server.py
+A solver daemon answering JSON requests over HTTP on localhost, so that the
+instances, and their shortest paths, are read and computed once for many
+solutions.
+
+Usage:
+./server.py [--help] [--port <N>] [--jobs <N>] [--root <directory>]
+            [--memory <MB>]
+
+    --help (-h) : print this message
+    --port (-p) : the port to listen to, 8642 by default
+    --jobs (-j) : the number of solver processes, all the cores by default.
+                  Each instance is always solved by the same process
+    --root (-r) : the directory the instance names are relative to, the
+                  current one by default. Nothing out of it is read
+    --memory (-m) : the memory each solver process may keep instances in, in
+                  megabytes, 256 by default
+
+Requests:
+    POST /solve  {"instance": name, "terminals": [labels], "seconds": s,
+                  "seed": n}
+                 Only "instance" is required. "terminals" replaces the ones
+                 of the instance file and "seconds" bounds the annealing. The
+                 answer is {"instance", "cost", "edges": [[u, v]...],
+                 "seconds", "cached", "stats"}, edges given by node labels.
+                 A wrong request, such as one with terminals that are not
+                 nodes of the instance, is answered 400
+    GET /stats   the requests served and the instance caches of the solver
+                 processes, as of their last answers
+"""
+
+import os
+import sys
+import json
+import time
+import getopt
+import httplib
+import threading
+import multiprocessing
+import BaseHTTPServer
+import SocketServer
+from collections import OrderedDict
+import instance
+import schedules
+from simulannealing import SimulatedAnnealing as SimulAnn
+
+class ServerError(Exception):
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return repr(self.value)
+
+class InstanceCache(object):
+    """
+    Least recently used cache of Instances with their graph and shortest
+    path engine, keyed by file name. An entry is dropped when its file
+    changes, and the oldest ones when the memory estimated for all of them
+    is above 'max_bytes'. The engines grow as they are used, so an entry is
+    measured again by update after each use. The last instance used is
+    always kept, but what its engine keeps is forgotten if it alone is above
+    'max_bytes'.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def get_size(inst, paths):
+        """ Estimate the bytes used now by an instance, its graph and its
+        shortest path engine """
+        n, m = inst.n, len(inst.u)
+        # The edge arrays, the CSR arrays and about 200 bytes per Node
+        return 48 * m + 200 * n + paths.get_size()
+
+    def get(self, filename):
+        """ Give the (instance, paths, cached) triple of the file """
+        st = os.stat(filename)
+        source = (st.st_size, st.st_mtime)
+        entry = self.entries.pop(filename, None)
+        if entry is not None and entry[0].source == source:
+            self.entries[filename] = entry
+            self.hits += 1
+            return entry[0], entry[1], True
+        if entry is not None:
+            self.bytes -= entry[2]
+
+        self.misses += 1
+        inst = instance.load(filename)
+        inst.get_graph()
+        paths = inst.get_paths()
+        self.entries[filename] = (inst, paths, 0)
+        self.update(filename)
+        return inst, paths, False
+
+    def update(self, filename):
+        """ Measure again the entry of the file, the last one used, and drop
+        the oldest ones while the cache is above max_bytes """
+        inst, paths, size = self.entries[filename]
+        new = InstanceCache.get_size(inst, paths)
+        self.entries[filename] = (inst, paths, new)
+        self.bytes += new - size
+        while self.bytes > self.max_bytes and len(self.entries) > 1:
+            name, old = self.entries.popitem(last=False)
+            self.bytes -= old[2]
+        if self.bytes > self.max_bytes:
+            paths.clear()
+            size, new = new, InstanceCache.get_size(inst, paths)
+            self.entries[filename] = (inst, paths, new)
+            self.bytes += new - size
+
+    def get_stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'entries': len(self.entries), 'bytes': self.bytes}
+
+# Cache of a solver process, set by _init_worker
+_worker = {}
+
+def _init_worker(max_bytes):
+    _worker['cache'] = InstanceCache(max_bytes)
+
+def _solve(request):
+    """ Solve a request in a solver process and give the answer as a dict,
+    with an 'error' key if it failed, 'rejected' too if the request was
+    wrong, and the state of the process's cache under 'cache' """
+    start = time.time()
+    cache = _worker['cache']
+    try:
+        inst, paths, cached = cache.get(request['filename'])
+        graph, terminals = inst.get_graph()
+        labels = request.get('terminals')
+        if labels is not None:
+            for label in labels:
+                if label > inst.n:
+                    return {'instance': request['instance'],
+                            'error': 'no node %s' %label, 'rejected': True,
+                            'cache': cache.get_stats()}
+            terminals = [inst.nodes[label - 1] for label in labels]
+        budget = None
+        if request.get('seconds') is not None:
+            budget = schedules.Budget(seconds=float(request['seconds']))
+        sa = SimulAnn(graph, terminals, paths=paths)
+        tree = sa.get_min_steiner_tree(seed=request.get('seed'),
+                budget=budget)
+        result = {'instance': request['instance'], 'cost': tree.get_cost(),
+                'edges': [[e.u.label, e.v.label] for e in tree.get_edges()],
+                'cached': cached, 'stats': sa.stats,
+                'seconds': time.time() - start}
+    except Exception, err:
+        result = {'instance': request.get('instance'),
+                'error': '%s: %s' %(type(err).__name__, err)}
+    # Count the trees and paths the engine kept while solving
+    if request['filename'] in cache.entries:
+        cache.update(request['filename'])
+    result['cache'] = cache.get_stats()
+    return result
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path != '/stats':
+            return self.reply(404, {'error': 'unknown path %s' %self.path})
+        self.reply(200, self.server.get_stats())
+
+    def do_POST(self):
+        if self.path != '/solve':
+            return self.reply(404, {'error': 'unknown path %s' %self.path})
+        try:
+            length = int(self.headers.getheader('content-length', 0))
+            request = json.loads(self.rfile.read(length))
+            if not isinstance(request, dict):
+                raise ValueError('a JSON object is expected')
+            result = self.server.solve(request)
+        except (ValueError, TypeError, ServerError), err:
+            return self.reply(400, {'error': str(err)})
+        self.reply(500 if 'error' in result else 200, result)
+
+    def reply(self, code, body):
+        data = json.dumps(body)
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format,
+                    *args)
+
+class SolverServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    HTTP server on localhost running the solutions over 'jobs' solver
+    processes. Each request is served by a thread of its own, waiting for
+    its solution while the other ones go on.
+
+    The processes live as long as the server and each one keeps the
+    instances it solved in an InstanceCache of 'max_bytes'. An instance is
+    always sent to the same process, chosen by its file name, so it is held
+    once and the caches use at most jobs * max_bytes. A request is fastest
+    when its instance was solved recently; the binary cache next to the
+    instance files also saves the parsing and Floyd-Warshall when a process
+    meets an instance for the first time.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=8642, jobs=None, root='.', max_bytes=256 << 20,
+            quiet=False):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', port),
+                Handler)
+        self.root = os.path.realpath(root)
+        self.jobs = jobs or multiprocessing.cpu_count()
+        self.quiet = quiet
+        # A pool of one process per solver, so a request can be sent to the
+        # process holding its instance
+        self.pools = [multiprocessing.Pool(1, _init_worker, (max_bytes,))
+                for i in xrange(self.jobs)]
+        # The cache of each process, as given by its last answer
+        self.caches = [InstanceCache(max_bytes).get_stats()
+                for i in xrange(self.jobs)]
+        self.lock = threading.Lock()
+        self.served = 0
+        self.failed = 0
+
+    def get_filename(self, name):
+        """ Give the path of an instance name, which must be in the root """
+        if not isinstance(name, basestring):
+            raise ServerError('an instance name is required')
+        filename = os.path.realpath(os.path.join(self.root, name))
+        if not filename.startswith(self.root + os.sep) or \
+        not os.path.isfile(filename):
+            raise ServerError('no instance %s' %name)
+        return filename
+
+    @staticmethod
+    def check_terminals(labels):
+        """ Check the terminals of a request are a list of node labels; the
+        solver process checks they are in its instance """
+        if labels is None:
+            return
+        if not isinstance(labels, list):
+            raise ServerError('the terminals must be a list')
+        for label in labels:
+            if type(label) not in (int, long) or label < 1:
+                raise ServerError('no node %s' %label)
+
+    @staticmethod
+    def check_options(request):
+        """ Check the seconds of a request are a positive number and its seed
+        an integer, if they are given """
+        seconds = request.get('seconds')
+        if seconds is not None and (type(seconds) not in (int, long, float)
+                or not seconds > 0):
+            raise ServerError('bad number of seconds %s' %seconds)
+        seed = request.get('seed')
+        if seed is not None and type(seed) not in (int, long):
+            raise ServerError('bad seed %s' %seed)
+
+    def solve(self, request):
+        """ Give the answer of a request, raising ServerError if it is wrong
+        """
+        request = dict(request)
+        request['filename'] = self.get_filename(request.get('instance'))
+        SolverServer.check_terminals(request.get('terminals'))
+        SolverServer.check_options(request)
+        k = hash(request['filename']) % self.jobs
+        result = self.pools[k].apply_async(_solve, (request,))
+        # A timeout keeps the wait interruptible
+        result = result.get(365 * 24 * 3600)
+        self.lock.acquire()
+        try:
+            self.caches[k] = result.pop('cache')
+            self.served += 1
+            self.failed += 'error' in result and 'rejected' not in result
+        finally:
+            self.lock.release()
+        if 'rejected' in result:
+            raise ServerError(result['error'])
+        return result
+
+    def get_stats(self):
+        """ Give the requests served and the cache of each solver process """
+        return {'served': self.served, 'failed': self.failed,
+                'jobs': self.jobs, 'caches': list(self.caches)}
+
+    def server_close(self):
+        BaseHTTPServer.HTTPServer.server_close(self)
+        for pool in self.pools:
+            pool.terminate()
+        for pool in self.pools:
+            pool.join()
+
+class Client(object):
+    """ Client of a SolverServer, giving the answers as dicts. A failed
+    request raises ServerError with the error given by the server """
+
+    def __init__(self, port=8642, host='127.0.0.1', timeout=None):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def request(self, method, path, body=None):
+        conn = httplib.HTTPConnection(self.host, self.port,
+                timeout=self.timeout)
+        try:
+            headers = {}
+            if body is not None:
+                body = json.dumps(body)
+                headers['Content-Type'] = 'application/json'
+            conn.request(method, path, body, headers)
+            response = conn.getresponse()
+            answer = json.loads(response.read())
+        finally:
+            conn.close()
+        if response.status != 200:
+            raise ServerError(answer.get('error'))
+        return answer
+
+    def solve(self, name, terminals=None, seconds=None, seed=None):
+        request = {'instance': name}
+        if terminals is not None:
+            request['terminals'] = list(terminals)
+        if seconds is not None:
+            request['seconds'] = seconds
+        if seed is not None:
+            request['seed'] = seed
+        return self.request('POST', '/solve', request)
+
+    def get_stats(self):
+        return self.request('GET', '/stats')
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv
+    port = 8642
+    jobs = None
+    root = '.'
+    memory = 256
+    try:
+        opts, args = getopt.getopt(argv[1:], "hp:j:r:m:", ["help", "port=",
+            "jobs=", "root=", "memory="])
+        for o, a in opts:
+            if o in ("-h", "--help"):
+                print __doc__
+                return 0
+            elif o in ("-p", "--port"):
+                port = int(a)
+            elif o in ("-j", "--jobs"):
+                jobs = int(a)
+            elif o in ("-r", "--root"):
+                root = a
+            elif o in ("-m", "--memory"):
+                memory = int(a)
+    except (getopt.error, ValueError), err:
+        print >>sys.stderr, err
+        print >>sys.stderr, "for help use --help"
+        return 2
+
+    server = SolverServer(port, jobs, root, memory << 20)
+    print 'Serving %s on 127.0.0.1:%d' %(server.root, server.server_port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,27 @@
-from graph_utils import FloydWarshall
+import graph as Graph
+import schedules
+from graph_utils import ShortestPaths
 from graph_utils import Neighborhood as Ngb
 from graph_utils import HAlgorithm as HA
 import math
 import time
 import random
 
+def metropolis(delta, t):
+    """ Tell whether a move raising the cost by delta is accepted at the
+    temperature t. At a temperature of 0 or below, which a geometric schedule
+    reaches after long enough, the search is greedy and refuses it """
+    if t <= 0:
+        return False
+    return random.random() < math.exp(-(delta/t))
+
 class SimulatedAnnealing(object):
 
-    def __init__(self, graph, terminals, percent=0.01, stop=40):
+    # Proposals between two 'sample' events
+    SAMPLE = 100
+
+    def __init__(self, graph, terminals, percent=0.01, stop=40, paths=None,
+            heuristic=HA, local_search=None, observers=()):
         """
         Percent and stop are used to determine when the execution can stop.
         It works as follow:
@@ -15,14 +29,56 @@ class SimulatedAnnealing(object):
             the optimal solution found is returned. This avoid we stay much time
             turning around a solution without significant results.
         For small instances, one may want set 'percent' to 0.
+
+        'paths' is a ShortestPaths engine already built for the graph. If it
+        is not given, one is built on each run.
+
+        'heuristic' is the class giving the initial solution: HAlgorithm or
+        Mehlhorn, which needs no shortest paths and is faster on big graphs.
+
+        'local_search' is a localsearch.LocalSearch run on the best tree at
+        the end, and every 'period' evaluations on the current one if its
+        period is set.
+
+        'observers' are callables f(event, data) told about the progress of
+        the runs, with the events of instrument.EVENTS. Without observers
+        nothing is sampled, so they cost nothing when unused.
+
+        After a run, 'stats' counts the proposals made, the ones accepted,
+        the new best solutions, the proposals skipped because they changed
+        nothing and the runs ended by an overflow of the acceptance test, and
+        'timings' holds the seconds spent in each phase.
         """
         self.graph = graph
         self.terminals = terminals
         self.optimal = None
         self.percent = percent
         self.stop = stop
+        self.paths = paths
+        self.heuristic = heuristic
+        self.local_search = local_search
+        self.observers = list(observers)
+        self.stats = dict.fromkeys(['proposals', 'accepted', 'improved',
+            'skipped', 'overflows'], 0)
+        self.timings = {}
+
+    def add_observer(self, observer):
+        self.observers.append(observer)
 
-    def get_min_steiner_tree(self, t_0=1, alfa=0.95, l1=20, l2=200):
+    def notify(self, event, **data):
+        for observer in self.observers:
+            observer(event, data)
+
+    def __phase(self, name, start):
+        """ Record the time of a phase begun at 'start' and give the time """
+        now = time.time()
+        self.timings[name] = now - start
+        if self.observers:
+            self.notify('phase', name=name, seconds=now - start)
+        return now
+
+    def get_min_steiner_tree(self, t_0=1, alfa=0.95, l1=20, l2=200, seed=None,
+            schedule=None, budget=None):
         """
         Get the minimum steiner tree.
         Options:
@@ -30,49 +86,216 @@ class SimulatedAnnealing(object):
             alfa: the cooling rate
             l1: how many coolings to do
             l2: how many iterations over the same temperature
+            seed: the seed of the random moves; the system one if None
+            schedule: a schedules.Schedule, replacing t_0, alfa and l2
+            budget: a schedules.Budget bounding the run, replacing l1. The
+                    'percent' and 'stop' rule is then not used: the run goes
+                    on until the budget is spent or cancelled
         """
-        random.seed()
-        fw = FloydWarshall(self.graph)
-        current = HA(self.graph, self.terminals, fw).get_steiner_tree()
-        self.optimal = current
-        count = 0
-        k = None
-        t = t_0
+        for tree in self.__search(t_0, alfa, l1, l2, seed, schedule, budget):
+            pass
+        return self.optimal
 
-        print 'Initial solution: %d' %current.get_cost()
-        for i in xrange(l1):
-            for j in xrange(l2):
-                new_cur = Ngb.get(self.graph, current, fw)
+    def iter_min_steiner_trees(self, t_0=1, alfa=0.95, l1=20, l2=200,
+            seed=None, schedule=None, budget=None):
+        """
+        Yield the SteinerTree of the initial solution and then each better one
+        as soon as it is found, with the options of get_min_steiner_tree.
+
+        The run can be stopped at any time: by leaving the loop over the trees
+        or closing the generator, by the seconds of the budget, or by calling
+        the budget's cancel from another thread. The best tree found so far
+        is then in 'optimal'.
+        """
+        trees = self.__search(t_0, alfa, l1, l2, seed, schedule, budget)
+        try:
+            for tree in trees:
+                if isinstance(tree, Graph.ArrayTree):
+                    tree = tree.to_tree()
+                yield tree
+        finally:
+            # Leaves a SteinerTree in 'optimal' when the loop is left early
+            trees.close()
 
-                delta = new_cur.get_cost() - current.get_cost()
+    def __search(self, t_0, alfa, l1, l2, seed, schedule, budget):
+        """ Run the search, yielding the best tree each time it changes as it
+        is kept, possibly an ArrayTree. The one left in 'optimal' at the end
+        is a SteinerTree """
+        random.seed(seed)
+        for key in self.stats:
+            self.stats[key] = 0
+        self.timings = {}
+        if schedule is None:
+            schedule = schedules.Geometric(t_0, alfa, l2)
+        schedule.reset()
+        stop = budget is None
+        if budget is None:
+            budget = schedules.Budget(evaluations=l1 * l2)
+        budget.start()
+
+        start = time.time()
+        fw = self.paths
+        if fw is None:
+            fw = ShortestPaths.get(self.graph)
+            start = self.__phase('paths', start)
+        current = self.heuristic(self.graph, self.terminals,
+                fw).get_steiner_tree()
+        start = self.__phase('heuristic', start)
+        # The moves are cheaper on the array form of the tree, when the graph
+        # has integer node numbers
+        if isinstance(self.graph, Graph.CSRGraph):
+            current = Graph.ArrayTree.from_tree(self.graph, current)
+        if self.local_search is not None and self.local_search.paths is None:
+            self.local_search.paths = fw
+        try:
+            for tree in self.__anneal(current, fw, schedule, budget, stop):
+                yield tree
+        finally:
+            if isinstance(self.optimal, Graph.ArrayTree):
+                self.optimal = self.optimal.to_tree()
+        start = self.__phase('annealing', start)
+        if self.local_search is not None and not budget.cancelled:
+            tree = self.local_search.improve(self.optimal)
+            self.__phase('local_search', start)
+            if tree.get_cost() < self.optimal.get_cost():
+                self.optimal = tree
+                yield tree
+
+    def __intensify(self, current):
+        """ Run the local search on the current tree, and give the tree to go
+        on from: the one found if it is better, the current one otherwise """
+        tree = current
+        if isinstance(current, Graph.ArrayTree):
+            tree = current.to_tree()
+        tree = self.local_search.improve(tree)
+        if tree.get_cost() >= current.get_cost():
+            return current
+        if isinstance(current, Graph.ArrayTree):
+            tree = Graph.ArrayTree.from_tree(self.graph, tree)
+        if tree.get_cost() < self.optimal.get_cost():
+            self.optimal = tree.copy()
+            self.stats['improved'] += 1
+            if self.observers:
+                self.notify('improved', cost=tree.get_cost(),
+                        evaluations=self.stats['proposals'])
+        return tree
+
+    def calibrate(self, tree, fw, t, budget, samples=10):
+        """ Give the factor k of the temperatures such that, at the
+        temperature t, a move raising the cost by the mean of the cost
+        differences of some proposals is accepted with probability 0.9999 """
+        deltas = []
+        for i in xrange(samples):
+            if budget.exhausted():
+                break
+            move = Ngb.propose(self.graph, tree, fw)
+            budget.spend()
+            self.stats['proposals'] += 1
+            if move is not None and move.delta != 0:
+                deltas.append(abs(move.delta))
+        if not deltas:
+            return None
+        return -(sum(deltas) / len(deltas) / (math.log(0.9999) * t))
+
+    def __anneal(self, current, fw, schedule, budget, stop):
+        """ Run the annealing from the current tree, which is changed in
+        place by the accepted moves, yielding the best tree each time it
+        changes. The last one is left in 'optimal' """
+        self.optimal = current.copy()
+        yield self.optimal
+        count = 0
+        stats = self.stats
+        observers = self.observers
+        sample = self.SAMPLE
+
+        if observers:
+            self.notify('initial', cost=current.get_cost())
+        k = self.calibrate(current, fw, schedule.temperature, budget)
+        period = self.local_search and self.local_search.period
+        while not budget.exhausted():
+            t = schedule.temperature
+            if period and budget.used % period == 0:
+                best = self.optimal
+                current = self.__intensify(current)
+                if self.optimal is not best:
+                    yield self.optimal
+            move = Ngb.propose(self.graph, current, fw)
+            budget.spend()
+            stats['proposals'] += 1
+            if observers and stats['proposals'] % sample == 0:
+                self.notify('sample', evaluations=stats['proposals'],
+                        temperature=t * (k or 1), cost=current.get_cost(),
+                        best=self.optimal.get_cost())
+            if move is None or move.delta == 0:
                 # Nothing to do
-                if delta == 0:
-                    continue
-
-                # In the beginning, k is such that every state is possible
-                if k is None:
-                    k = -(delta/(math.log(0.9999) * t))
-
-                if delta < 0.0:
-                    current = new_cur
-                    if current.get_cost() < self.optimal.get_cost():
-                        print 'New optimal solution: %d' \
-                        %current.get_cost()
-                        self.optimal = current
-                else:
-                    try:
-                        if random.random() < math.exp(-(delta/(k * t))):
-                            current = new_cur
-                    except OverflowError:
-                        return self.optimal
-
-                # Stop after some time without significant good results
-                if abs(delta) < self.percent * current.get_cost():
-                    count += 1
-                    if count >= self.stop:
-                        print 'Stopping because little difference'
-                        return self.optimal
-                else:
-                    count = 0
-            t *= alfa
-        return self.optimal
+                stats['skipped'] += 1
+                schedule.update(False, False)
+                continue
+
+            delta = move.delta
+            # Without any sample, k is such that every state is possible
+            if k is None:
+                k = -(abs(delta)/(math.log(0.9999) * t))
+
+            accepted = improved = False
+            if delta < 0.0:
+                move.apply(current)
+                accepted = True
+                if current.get_cost() < self.optimal.get_cost():
+                    self.optimal = current.copy()
+                    improved = True
+                    stats['improved'] += 1
+                    if observers:
+                        self.notify('improved', cost=current.get_cost(),
+                                evaluations=stats['proposals'])
+                    yield self.optimal
+            else:
+                try:
+                    if metropolis(delta, k * t):
+                        move.apply(current)
+                        accepted = True
+                except (OverflowError, ZeroDivisionError):
+                    stats['overflows'] += 1
+                    self.__stopped('overflow')
+                    return
+            stats['accepted'] += accepted
+            schedule.update(accepted, improved)
+
+            # Stop after some time without significant good results
+            if not stop:
+                continue
+            if abs(delta) < self.percent * current.get_cost():
+                count += 1
+                if count >= self.stop:
+                    self.__stopped('little difference')
+                    return
+            else:
+                count = 0
+        self.__stopped('cancelled' if budget.cancelled else 'budget')
+
+    def __stopped(self, reason):
+        if self.observers:
+            self.notify('stopped', reason=reason,
+                    evaluations=self.stats['proposals'])
+
+    def run_at_temperature(self, tree, t, steps, paths):
+        """
+        Do 'steps' Metropolis iterations over the tree at the fixed temperature
+        t, given in cost units, changing the tree in place. Give the best tree
+        seen on the way.
+        """
+        best = tree.copy()
+        for i in xrange(steps):
+            move = Ngb.propose(self.graph, tree, paths)
+            if move is None or move.delta == 0:
+                continue
+            try:
+                accepted = move.delta < 0 or metropolis(move.delta, t)
+            except (OverflowError, ZeroDivisionError):
+                # The temperature is too low for any uphill move
+                accepted = False
+            if accepted:
+                move.apply(tree)
+                if tree.get_cost() < best.get_cost():
+                    best = tree.copy()
+        return best
@@ -4,11 +4,35 @@
 Stein : a Steiner Tree problem solver
 
 Usage:
-./stein.py [--help] [--draw <filename>] [<instance>]
+./stein.py [--help] [--draw <filename>] [--jobs <N>] [--replicas <K>]
+          [--mehlhorn] [--reduce] [--schedule <name>] [--time <seconds>]
+          [--local-search] [--no-cache] [<instance>]
+./stein.py --batch <output> [--jobs <N>] <directory or glob>...
 
     --help (-h) : print this message
     --draw (-d) : draw the solution found. It needs of 'gvgen' and 'pygraphviz'
                   modules installed
+    --jobs (-j) : run N independent annealing chains in parallel processes and
+                  keep the best solution
+    --replicas (-r) : solve by parallel tempering with K replicas at fixed
+                  temperatures, exchanging their states (over --jobs processes)
+    --mehlhorn (-m) : build the initial solution with Mehlhorn's algorithm, faster
+                  than the default one on big instances
+    --reduce    : shrink the instance with the classic reduction tests before
+                  solving it, and expand the solution back
+    --schedule (-s) : the cooling schedule: geometric (the default), lundy-mees
+                  or adaptive, which reheats when the search stagnates
+    --time (-t) : anneal until this many seconds have passed, instead of a
+                  fixed number of iterations. With --replicas, the exchange
+                  rounds go on until that time instead of stopping after 50
+    --local-search (-l) : improve the tree found by a tabu search of key path
+                  exchanges and key vertex eliminations and insertions
+    --no-cache  : do not read nor write the binary cache of the instance, kept
+                  next to it as <instance>.stpb with its shortest paths
+    --batch (-b) : solve every instance found in the given directories, files
+                  or glob patterns over --jobs processes, largest first. Each
+                  result is appended to <output> (CSV if it ends with .csv,
+                  JSON lines otherwise) and instances already there are skipped
     <instance>  : a graph description file. If no one is given, the program will
                   generate a random one.
 """
@@ -17,42 +41,42 @@ import sys
 import getopt
 import time
 from simulannealing import SimulatedAnnealing as SimulAnn
+from parallel import MultiStart, ParallelTempering
+from batch import Batch
+from reduction import Reduction
+import schedules
+from localsearch import LocalSearch
+from instrument import Printer
 import graph as Graph
-from graph_utils import GraphGen
+import instance
+from graph_utils import GraphGen, HAlgorithm, Mehlhorn
 
 class Usage(Exception):
     def __init__(self, msg):
         self.msg = msg
 
-def read_from_file(filename):
-    g = Graph.Graph()
+def read_instance(filename, cache=False):
     try:
-        f = open(filename, 'r')
+        inst = instance.load(filename, cache)
     # Commented because python 2.5 doesnt understand it
     except IOError: #as (errno, strerror):
         print "I/O error({0}): {1}"#.format(errno, strerror)
-        return (None, None)
-    num_nodes = int(f.readline().split()[1])
-    num_edges = int(f.readline().split()[1])
-
-    print 'Read %d nodes and %d edges' %(num_nodes, num_edges)
-    nodes = {}
-    for i in xrange(num_nodes):
-        nodes[i] = Graph.Node(i + 1)
-        g.add_node(nodes[i])
-    for i in xrange(num_edges):
-        u, v, w = f.readline().split()[1:]
-        g.add_edge(Graph.Edge(nodes[int(u)-1], nodes[int(v)-1], float(w)))
+        return None
 
-    # Read a empty line
-    f.readline()
+    print 'Read %d nodes and %d edges' %(inst.n, len(inst.u))
+    return inst
 
-    num_term = int(f.readline().split()[1])
-    terminals = [nodes[int(f.readline().split()[1])-1] for i in
-            xrange(num_term)]
-    f.close()
-
-    return (g, terminals)
+def read_from_file(filename, csr=False):
+    """ Give the (graph, terminals) pair of an instance file, the graph as a
+    Graph, or with 'csr' as the read-only CSRGraph the solvers are fastest
+    on. (None, None) if it cannot be read """
+    inst = read_instance(filename)
+    if inst is None:
+        return (None, None)
+    graph, terminals = inst.get_graph()
+    if not csr:
+        graph = graph.copy()
+    return (graph, terminals)
 
 def print_tree(tree, arg):
     if not isinstance(arg, str):
@@ -63,13 +87,49 @@ def print_tree(tree, arg):
     for e in tree.get_edges():
         print '%s %s' %(str(e.u.label), str(e.v.label))
 
-def process(arg, draw=False, filename=None):
+def print_result(result):
+    if result['error'] is not None:
+        print '%s: %s' %(result['instance'], result['error'])
+    else:
+        print '%s: %f (%.1fs)' %(result['instance'], result['cost'],
+                result['seconds'])
+
+def process(arg, draw=False, filename=None, jobs=1, replicas=0, cache=True,
+        heuristic=HAlgorithm, reduce=False, options={}, local_search=False):
     if arg is None:
-        graph, terminals = GraphGen.generate(steiner=True)
+        graph, terminals = GraphGen.generate(steiner=True, csr=True)
+        paths = None
     else:
-        graph, terminals = read_from_file(arg)
+        inst = read_instance(arg, cache)
+        if inst is None:
+            return
+        if reduce:
+            reduction = Reduction(inst)
+            inst = reduction.reduce()
+            print 'Reduced to %d nodes and %d edges' %(inst.n, len(inst.u))
+        graph, terminals = inst.get_graph()
+        paths = inst.get_paths(shared=jobs > 1)
 
-    steiner = SimulAnn(graph, terminals).get_min_steiner_tree()
+    search = None
+    if local_search:
+        search = LocalSearch(graph, terminals, paths)
+    if replicas > 1:
+        budget = options.get('budget')
+        # A budget alone ends the rounds
+        rounds = 50 if budget is None else None
+        steiner = ParallelTempering(graph, terminals, replicas, jobs,
+                paths, heuristic, search).get_min_steiner_tree(rounds=rounds,
+                budget=budget)
+    elif jobs > 1:
+        steiner = MultiStart(graph, terminals, jobs, paths=paths,
+                heuristic=heuristic, local_search=search
+                ).get_min_steiner_tree(**options)
+    else:
+        steiner = SimulAnn(graph, terminals, paths=paths, heuristic=heuristic,
+                local_search=search, observers=[Printer()]
+                ).get_min_steiner_tree(**options)
+    if reduce and arg is not None:
+        steiner = reduction.expand(steiner)
     if draw is True:
         steiner.draw(filename)
     print_tree(steiner, arg)
@@ -80,8 +140,18 @@ def main(argv=None):
     try:
         draw=False
         filename=None
+        jobs=1
+        replicas=0
+        output=None
+        cache=True
+        heuristic=HAlgorithm
+        reduce=False
+        options={}
+        local_search=False
         try:
-            opts, args = getopt.getopt(argv[1:], "h:d", ["help", "draw="])
+            opts, args = getopt.getopt(argv[1:], "h:dj:r:b:ms:t:l", ["help",
+                "draw=", "jobs=", "replicas=", "batch=", "mehlhorn",
+                "reduce", "schedule=", "time=", "local-search", "no-cache"])
         except getopt.error, msg:
             raise Usage(msg)
         # Process options
@@ -92,10 +162,51 @@ def main(argv=None):
             elif o in ("-d", "--draw"):
                 draw = True
                 filename = a
+            elif o in ("-j", "--jobs"):
+                try:
+                    jobs = int(a)
+                except ValueError:
+                    raise Usage('--jobs needs a number')
+            elif o in ("-r", "--replicas"):
+                try:
+                    replicas = int(a)
+                except ValueError:
+                    raise Usage('--replicas needs a number')
+            elif o in ("-b", "--batch"):
+                output = a
+            elif o in ("-m", "--mehlhorn"):
+                heuristic = Mehlhorn
+            elif o in ("-s", "--schedule"):
+                try:
+                    options['schedule'] = schedules.SCHEDULES[a]()
+                except KeyError:
+                    raise Usage('--schedule is one of %s'
+                            %', '.join(sorted(schedules.SCHEDULES)))
+            elif o in ("-t", "--time"):
+                try:
+                    options['budget'] = schedules.Budget(seconds=float(a))
+                except ValueError:
+                    raise Usage('--time needs a number')
+            elif o in ("-l", "--local-search"):
+                local_search = True
+            elif o == "--reduce":
+                reduce = True
+            elif o == "--no-cache":
+                cache = False
+        if replicas > 1 and 'schedule' in options:
+            raise Usage('--schedule does not apply to --replicas, whose '
+                    'temperatures are fixed')
+        if output is not None:
+            if args == []:
+                raise Usage('--batch needs directories, files or globs')
+            Batch(args, output, jobs, cache).run(print_result)
+            return 0
         # Process arguments
-        map(lambda arg: process(arg, draw, filename), args)
+        map(lambda arg: process(arg, draw, filename, jobs, replicas, cache,
+            heuristic, reduce, options, local_search), args)
         if args == []:
-            process(None)
+            process(None, jobs=jobs, replicas=replicas, heuristic=heuristic,
+                    options=options, local_search=local_search)
     except Usage, err:
         print >>sys.stderr, err.msg
         print >>sys.stderr, "for help use --help"
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+
+"""benchmark.py
+Run the solver over the bundled SteinLib instances and write, for each one,
+the time of each phase, the peak memory, the annealing evaluations per second
+and the gap to the published optimum, as JSON.
+
+Usage:
+./benchmark.py [--output <file>] [--evaluations <N>] [--seed <S>]
+               [--compare <file>] [<instance or directory>...]
+
+    --output (-o) : where the JSON results go, benchmark.json by default
+    --evaluations (-e) : annealing proposals per instance, 4000 by default
+    --seed (-s) : seed of the annealing, 1 by default
+    --compare (-c) : a JSON file of an earlier run; the instances that became
+                  slower by more than 20% or whose cost grew are listed
+    <instance or directory> : what to run, ../inst/{b,mc,p4z,x} by default
+
+Each instance runs in a process of its own, so the peak memory is its own
+and nothing is shared between instances. The binary cache is not used: the
+shortest paths are computed every time.
+"""
+
+import sys
+sys.path.append("..")
+
+import os
+import json
+import time
+import getopt
+import platform
+import resource
+import multiprocessing
+import instance
+import schedules
+from batch import find_instances
+from graph_utils import ShortestPaths, HAlgorithm
+from simulannealing import SimulatedAnnealing as SimulAnn
+
+DIRECTORIES = ['../inst/b', '../inst/mc', '../inst/p4z', '../inst/x']
+
+# Optimal values published by SteinLib, as in the showset pages of each set
+OPTIMA = {
+    'b01': 82, 'b02': 83, 'b03': 138, 'b04': 59, 'b05': 61, 'b06': 122,
+    'b07': 111, 'b08': 104, 'b09': 220, 'b10': 86, 'b11': 88, 'b12': 174,
+    'b13': 165, 'b14': 235, 'b15': 318, 'b16': 127, 'b17': 131, 'b18': 218,
+    'mc2': 71, 'mc3': 47, 'mc7': 3417, 'mc8': 1566, 'mc11': 11689,
+    'mc13': 92,
+    'p401': 155, 'p402': 116, 'p403': 179, 'p404': 270, 'p405': 270,
+    'p406': 290, 'p407': 590, 'p408': 542, 'p409': 963, 'p410': 1010,
+    'berlin52': 1044, 'brasil58': 13655, 'world666': 122467,
+}
+
+class Progress(object):
+    """ Observer keeping the time at which each new best cost was found, as
+    (seconds, cost) pairs, from the time it is made """
+
+    def __init__(self):
+        self.began = time.time()
+        self.costs = []
+
+    def __call__(self, event, data):
+        if event in ('initial', 'improved'):
+            self.costs.append((time.time() - self.began, data['cost']))
+
+def name_of(filename):
+    return os.path.basename(filename).split('.')[0]
+
+def gap(cost, optimum):
+    """ Give how far the cost is above the optimum, as a fraction of it """
+    if optimum is None:
+        return None
+    return float(cost - optimum) / optimum
+
+def run(args):
+    """ Solve one instance and give its measures as a dict """
+    filename, evaluations, seed = args
+    optimum = OPTIMA.get(name_of(filename))
+    result = {'instance': filename, 'optimum': optimum}
+    phases = result['seconds'] = {}
+
+    start = time.time()
+    inst = instance.load(filename, cache=False)
+    graph, terminals = inst.get_graph()
+    phases['load'] = time.time() - start
+
+    start = time.time()
+    paths = ShortestPaths.get(graph, nodes=inst.nodes)
+    phases['paths'] = time.time() - start
+
+    start = time.time()
+    initial = HAlgorithm(graph, terminals, paths).get_steiner_tree()
+    phases['heuristic'] = time.time() - start
+
+    progress = Progress()
+    sa = SimulAnn(graph, terminals, paths=paths, observers=[progress])
+    tree = sa.get_min_steiner_tree(seed=seed,
+            budget=schedules.Budget(evaluations=evaluations))
+    phases['annealing'] = sa.timings['annealing']
+    # The annealer builds its initial solution again before the first event
+    offset = phases['load'] + phases['paths'] + phases['heuristic'] - \
+            sa.timings['heuristic']
+
+    result.update({
+        'nodes': len(graph),
+        'edges': graph.get_edge_count(),
+        'terminals': len(terminals),
+        'paths': type(paths).__name__,
+        'initial': initial.get_cost(),
+        'cost': tree.get_cost(),
+        'gap': gap(tree.get_cost(), optimum),
+        'stats': sa.stats,
+        'evaluations_per_second': sa.stats['proposals'] /
+            max(sa.timings['annealing'], 1e-9),
+        # Kilobytes on Linux
+        'peak_memory': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        # Time since the instance was read, and gap of the best tree then
+        'gap_over_time': [(offset + s, gap(c, optimum))
+            for s, c in progress.costs],
+    })
+    return result
+
+def compare(old, new):
+    """ Print the instances slower by more than 20% or whose cost grew """
+    before = dict((r['instance'], r) for r in old['results'])
+    for r in new['results']:
+        b = before.get(r['instance'])
+        if b is None:
+            continue
+        t_old = sum(b['seconds'].values())
+        t_new = sum(r['seconds'].values())
+        if t_new > 1.2 * t_old:
+            print '%s: %.2fs -> %.2fs' %(r['instance'], t_old, t_new)
+        if r['cost'] > b['cost']:
+            print '%s: cost %g -> %g' %(r['instance'], b['cost'], r['cost'])
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv
+    output = 'benchmark.json'
+    evaluations = 4000
+    seed = 1
+    previous = None
+    try:
+        opts, args = getopt.getopt(argv[1:], "ho:e:s:c:", ["help", "output=",
+            "evaluations=", "seed=", "compare="])
+        for o, a in opts:
+            if o in ("-h", "--help"):
+                print __doc__
+                return 0
+            elif o in ("-o", "--output"):
+                output = a
+            elif o in ("-e", "--evaluations"):
+                evaluations = int(a)
+            elif o in ("-s", "--seed"):
+                seed = int(a)
+            elif o in ("-c", "--compare"):
+                previous = a
+    except (getopt.error, ValueError), err:
+        print >>sys.stderr, err
+        print >>sys.stderr, "for help use --help"
+        return 2
+
+    # Smallest first, so the quick ones are known soon
+    files = find_instances(args or DIRECTORIES)[::-1]
+    results = []
+    for filename in files:
+        pool = multiprocessing.Pool(1)
+        try:
+            result = pool.apply(run, ((filename, evaluations, seed),))
+        finally:
+            pool.terminate()
+            pool.join()
+        results.append(result)
+        print '%-28s %8.2fs %10g gap %s' %(filename,
+                sum(result['seconds'].values()), result['cost'],
+                'n/a' if result['gap'] is None else '%.2f%%' %(
+                    100 * result['gap']))
+
+    report = {'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'machine': platform.machine(), 'evaluations': evaluations,
+            'seed': seed, 'results': results}
+    f = open(output, 'w')
+    try:
+        json.dump(report, f, indent=1, sort_keys=True)
+    finally:
+        f.close()
+
+    if previous is not None:
+        f = open(previous)
+        try:
+            compare(json.load(f), report)
+        finally:
+            f.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
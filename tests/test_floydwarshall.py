@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+import sys
+sys.path.append("..")
+
+import os
+from time import time
+from array import array
+import floydwarshall as fw
+from graph_utils import GraphGen
+from stein import read_from_file
+
+# Instances used in the timing comparison
+instances = ['../inst/x/brasil58.txt', '../inst/x/world666.txt',
+        '../inst/p4z/p401.stp', '../inst/p4z/p405.stp',
+        '../inst/p4z/p410.stp']
+
+def adjacency(graph):
+    nodes, us, vs, ws = graph.get_edge_arrays()
+    n = len(nodes)
+    m_adj = array('d', [0.0]) * (n*n)
+    for u, v, w in zip(us, vs, ws):
+        m_adj[u*n+v] = m_adj[v*n+u] = w
+    return n, m_adj
+
+def old_kernel(n, m_adj):
+    """ The kernel through the element by element interface, the copies in
+    and out included in the time """
+    tempo = time()
+    a = fw.new_doubleArray(n*n)
+    d = fw.new_doubleArray(n*n)
+    p = fw.new_intArray(n*n)
+    for i in xrange(n*n):
+        fw.doubleArray_setitem(a, i, m_adj[i])
+    fw.floydwarshall(n, a, d, p)
+    dist = array('d', (fw.doubleArray_getitem(d, i) for i in xrange(n*n)))
+    tempo = time() - tempo
+    map(fw.delete_doubleArray, (a, d))
+    fw.delete_intArray(p)
+    return dist, tempo
+
+def new_kernel(n, m_adj):
+    """ The kernel through the buffer interface, which copies nothing """
+    tempo = time()
+    dist = array('d', [0.0]) * (n*n)
+    pred = array('i', [0]) * (n*n)
+    fw.floydwarshall_buffer(n, m_adj, dist, pred)
+    return dist, pred, time() - tempo
+
+def path_cost(n, m_adj, dist, pred, i, j):
+    """ Walk the predecessors back from j and sum the adjacency weights """
+    if pred[i*n+j] < 0:
+        return dist[i*n+j]
+    cost = 0.0
+    while j != i:
+        k = pred[i*n+j]
+        cost += m_adj[k*n+j]
+        j = k
+    return cost
+
+def check(n, m_adj):
+    d_old, t_old = old_kernel(n, m_adj)
+    d_new, pred, t_new = new_kernel(n, m_adj)
+    assert d_old == d_new, 'distances differ'
+    for i in xrange(0, n, max(1, n/50)):
+        for j in xrange(n):
+            assert path_cost(n, m_adj, d_new, pred, i, j) == d_new[i*n+j], \
+                    'bad path %d -> %d' %(i, j)
+    return t_old, t_new
+
+# Correctness over random graphs
+for nodes_number in [2, 7, 33, 100, 130]:
+    graph = GraphGen.generate(nodes_number=nodes_number)
+    check(*adjacency(graph))
+print 'Random graphs: ok'
+
+for name in instances:
+    if not os.path.exists(name):
+        continue
+    graph, terminals = read_from_file(name)
+    t_old, t_new = check(*adjacency(graph))
+    print '%s: by element %.3fs, by buffer %.3fs (%.1fx)' %(
+            os.path.basename(name), t_old, t_new, t_old/max(t_new, 1e-9))
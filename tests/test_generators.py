@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+
+import sys
+sys.path.append("..")
+
+from time import time
+import generators
+from graph_utils import ArrayUnionFind
+
+def components(inst):
+    uf = ArrayUnionFind(inst.n)
+    count = inst.n
+    for a, b in zip(inst.u, inst.v):
+        count -= uf.union(a, b)
+    return count
+
+# Every family gives the same instance for the same seed, and a connected one
+families = [(generators.complete, (60,)), (generators.erdos_renyi, (500, 800)),
+        (generators.geometric, (300, 0.05)), (generators.geometric, (52,)),
+        (generators.grid, (20, 30))]
+for family, args in families:
+    a = family(*args, seed=5)
+    b = family(*args, seed=5)
+    assert (a.u, a.v, a.w, a.terminals) == (b.u, b.v, b.w, b.terminals), \
+            a.name
+    assert components(a) == 1, '%s is not connected' %a.name
+    pairs = set((min(x, y), max(x, y)) for x, y in zip(a.u, a.v))
+    assert len(pairs) == len(a.u) and all(x != y for x, y in pairs), a.name
+    assert len(set(a.terminals)) == len(a.terminals) >= 2, a.name
+print 'Families: ok'
+
+for radius in (0, -0.5):
+    try:
+        generators.geometric(10, radius)
+    except ValueError:
+        pass
+    else:
+        assert False, 'radius %s accepted' %radius
+
+# Sizes of the stress tests
+for family, args in [(generators.erdos_renyi, (100000, 500000)),
+        (generators.grid, (500, 500)),
+        (generators.geometric, (50000, 0.008)),
+        (generators.complete, (1000,))]:
+    tempo = time()
+    inst = family(*args, seed=1)
+    print '%s: %d edges in %.2fs' %(inst.name, len(inst.u), time() - tempo)
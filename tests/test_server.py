@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+import sys
+sys.path.append("..")
+
+import threading
+from time import time
+from server import SolverServer, Client, ServerError
+
+# A server on a free port, answering from a thread of this process
+server = SolverServer(port=0, jobs=2, root='../inst', quiet=True)
+thread = threading.Thread(target=server.serve_forever)
+thread.daemon = True
+thread.start()
+client = Client(server.server_port)
+
+try:
+    tempo = time()
+    first = client.solve('b/b01.stp', seed=1)
+    print 'Cold: %.3fs, cost %g' %(time() - tempo, first['cost'])
+    assert first['cost'] == 82 and not first['cached']
+
+    # Concurrent requests, all sent to the process holding the instance
+    results = []
+    def solve():
+        results.append(client.solve('b/b01.stp', seconds=0.5))
+    threads = [threading.Thread(target=solve) for i in xrange(4)]
+    tempo = time()
+    map(lambda t: t.start(), threads)
+    map(lambda t: t.join(), threads)
+    print '4 concurrent: %.3fs, costs %s' %(time() - tempo,
+            [r['cost'] for r in results])
+    assert len(results) == 4 and any(r['cached'] for r in results)
+
+    # Other terminals on the same graph
+    other = client.solve('b/b01.stp', terminals=[1, 2, 3], seed=1)
+    assert other['cost'] > 0
+    assert set(x for e in other['edges'] for x in e) >= set([1, 2, 3])
+
+    for name in ['b/nothing.stp', '../stein.py', None]:
+        try:
+            client.solve(name)
+        except ServerError:
+            pass
+        else:
+            assert False, 'no error for %s' %name
+    # Wrong terminals are answered 400, the last one by the solver process
+    for terminals in [[0], ['1'], [1.5], [51]]:
+        try:
+            client.solve('b/b01.stp', terminals=terminals)
+        except ServerError:
+            pass
+        else:
+            assert False, 'no error for the terminals %s' %terminals
+
+    for options in [{'seconds': 'abc'}, {'seconds': -1}, {'seed': 1.5}]:
+        try:
+            client.solve('b/b01.stp', **options)
+        except ServerError:
+            pass
+        else:
+            assert False, 'no error for %s' %options
+
+    stats = client.get_stats()
+    print 'Stats: %s' %stats
+    assert stats['served'] == 7 and stats['failed'] == 0
+    # b01 was read once, by the one process it is sent to
+    assert sum(c['misses'] for c in stats['caches']) == 1
+    print 'Server: ok'
+finally:
+    server.shutdown()
+    server.server_close()